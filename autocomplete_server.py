@@ -0,0 +1,300 @@
+import argparse
+import heapq
+import json
+import re
+import time
+from array import array
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from region_registry import ID_LENGTHS, LEVEL_NAMES, RegionRegistry
+
+# Local autocomplete over every province, kabupaten/kota, kecamatan and
+# kelurahan name, with the full ancestry of each match, so a client needs one
+# request per keystroke instead of the four cascading list downloads that
+# contoh.html does.
+#
+#   GET /search?q=bakong&limit=10&parent=1101&level=kelurahan
+#
+# Regions are numbered by a static rank (level first, then shorter names), so
+# every posting list is already in rank order and the best matches are simply
+# the smallest keys. Matches whose whole name starts with the query come
+# before matches on a later word.
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+# Prefixes up to this length get their top results precomputed, since they
+# match thousands of names. Enough are kept for the largest limit, so only a
+# parent or level filter that rejects most of them walks the full match.
+CACHED_PREFIX_LEN = 3
+CACHED_TOP = MAX_LIMIT
+
+# With a parent filter, subtrees up to this size are scored directly instead
+# of filtering the matches of the query across the whole country
+SUBTREE_SCAN_MAX = 2000
+
+def tokenize(text):
+    return re.findall(r'[a-z0-9]+', text.lower())
+
+class AutocompleteIndex:
+    def __init__(self, registry):
+        self.registry = registry
+
+        regions = []
+        for level_order, level in enumerate(LEVEL_NAMES):
+            for pos, region in enumerate(registry.iter_level(level)):
+                nama = region.nama
+                regions.append((level_order, len(nama), nama, region.id, level, pos))
+        regions.sort()
+
+        # key -> (level, pos in the registry) and normalized name
+        self._levels = [r[4] for r in regions]
+        self._positions = array('I', [r[5] for r in regions])
+        self._names = [' '.join(tokenize(r[2])) for r in regions]
+        # (level, pos) -> key, for walking a subtree in registry order
+        self._keys_by_level = {level: array('I', bytes(4 * registry.count(level))) for level in LEVEL_NAMES}
+        for key, r in enumerate(regions):
+            self._keys_by_level[r[4]][r[5]] = key
+
+        # token -> keys containing it, ascending (= rank order)
+        postings = {}
+        for key, name in enumerate(self._names):
+            for token in set(name.split()):
+                postings.setdefault(token, array('I')).append(key)
+        self._tokens = sorted(postings)
+        self._postings = [postings[t] for t in self._tokens]
+
+        # Whole names in alphabetical order, for "name starts with query"
+        order = sorted(range(len(self._names)), key=self._names.__getitem__)
+        self._sorted_names = [self._names[k] for k in order]
+        self._sorted_name_keys = array('I', order)
+
+        self._token_cache = {}
+        self._name_cache = {}
+        self._count_cache = {}
+        self._build_prefix_caches()
+
+    def _build_prefix_caches(self):
+        prefixes = set()
+        for token in self._tokens:
+            for n in range(1, min(len(token), CACHED_PREFIX_LEN) + 1):
+                prefixes.add(token[:n])
+        for prefix in prefixes:
+            self._token_cache[prefix] = array('I', self._top_token_keys(prefix, CACHED_TOP + 1))
+            self._name_cache[prefix] = array('I', self._top_name_keys(prefix, CACHED_TOP + 1))
+            self._count_cache[prefix] = self._term_count(prefix)
+
+    def __len__(self):
+        return len(self._names)
+
+    def _token_range(self, term):
+        start = bisect_left(self._tokens, term)
+        stop = bisect_left(self._tokens, term + '\uffff', start)
+        return start, stop
+
+    def _top_token_keys(self, term, count):
+        start, stop = self._token_range(term)
+        merged = heapq.merge(*self._postings[start:stop])
+        keys = []
+        for key in merged:
+            if not keys or keys[-1] != key:
+                keys.append(key)
+                if len(keys) >= count:
+                    break
+        return keys
+
+    def _top_name_keys(self, query, count):
+        start = bisect_left(self._sorted_names, query)
+        stop = bisect_left(self._sorted_names, query + '\uffff', start)
+        return heapq.nsmallest(count, self._sorted_name_keys[start:stop])
+
+    def _token_keys(self, term):
+        # Keys whose name has a word starting with term, in rank order
+        cached = self._token_cache.get(term)
+        if cached is not None:
+            yield from cached
+            if len(cached) <= CACHED_TOP:
+                return
+        start, stop = self._token_range(term)
+        seen = cached[-1] if cached else -1
+        last = -1
+        for key in heapq.merge(*self._postings[start:stop]):
+            if key != last and key > seen:
+                yield key
+            last = key
+
+    def _name_keys(self, query):
+        # Keys whose whole name starts with query, in rank order. A cached
+        # prefix only sorts its full range if the caller reads past the top.
+        cached = self._name_cache.get(query)
+        if cached is not None:
+            yield from cached
+            if len(cached) <= CACHED_TOP:
+                return
+        seen = cached[-1] if cached else -1
+        for key in self._name_range_keys(query):
+            if key > seen:
+                yield key
+
+    def _name_range_keys(self, query):
+        # Every key whose whole name starts with query, in rank order
+        start = bisect_left(self._sorted_names, query)
+        stop = bisect_left(self._sorted_names, query + '\uffff', start)
+        return sorted(self._sorted_name_keys[start:stop])
+
+    def _term_count(self, term):
+        # Number of (token, region) postings under term, an upper bound on
+        # the regions it matches
+        cached = self._count_cache.get(term)
+        if cached is not None:
+            return cached
+        start, stop = self._token_range(term)
+        return sum(len(p) for p in self._postings[start:stop])
+
+    def _subtree(self, parent, level=None):
+        # (size, ranges) of the regions under parent, per deeper level
+        ranges = []
+        for child_level in LEVEL_NAMES:
+            if ID_LENGTHS[child_level] <= len(parent) or (level and child_level != level):
+                continue
+            ranges.append((child_level, *self.registry.descendant_range(parent, child_level)))
+        return sum(stop - start for _, start, stop in ranges), ranges
+
+    def _region(self, key):
+        return self.registry.region_at(self._levels[key], self._positions[key])
+
+    def search(self, text, limit=DEFAULT_LIMIT, parent=None, level=None):
+        terms = tokenize(text)
+        if not terms:
+            return []
+        query = ' '.join(terms)
+        parent = str(parent) if parent else None
+
+        size = ranges = allowed = None
+        if parent is not None:
+            size, ranges = self._subtree(parent, level)
+            if not ranges:
+                return []
+            # level -> (start, stop) registry positions under the parent
+            allowed = {lvl: (start, stop) for lvl, start, stop in ranges}
+
+        def matches_terms(key):
+            name_words = self._names[key].split()
+            return all(any(w.startswith(t) for w in name_words) for t in terms)
+
+        def accept(key):
+            lvl = self._levels[key]
+            if level is not None and lvl != level:
+                return False
+            if allowed is not None:
+                if lvl not in allowed:
+                    return False
+                start, stop = allowed[lvl]
+                if not start <= self._positions[key] < stop:
+                    return False
+            return matches_terms(key)
+
+        if ranges is not None and size <= min(SUBTREE_SCAN_MAX, min(self._term_count(t) for t in terms)):
+            # Small subtree: score it directly
+            candidates = [self._keys_by_level[lvl][pos]
+                          for lvl, start, stop in ranges for pos in range(start, stop)]
+            matched = [k for k in candidates if matches_terms(k)]
+            matched.sort(key=lambda k: (not self._names[k].startswith(query), k))
+            return [self._result(key) for key in matched[:limit]]
+
+        results = []
+        chosen = set()
+        for key in self._name_keys(query):
+            if accept(key):
+                results.append(key)
+                chosen.add(key)
+                if len(results) >= limit:
+                    break
+
+        if len(results) < limit:
+            # Walk the rarest term's matches and check the other terms per name
+            driver = min(terms, key=self._term_count)
+            for key in self._token_keys(driver):
+                if key not in chosen and accept(key):
+                    results.append(key)
+                    if len(results) >= limit:
+                        break
+
+        return [self._result(key) for key in results]
+
+    def _result(self, key):
+        region = self._region(key)
+        return {
+            'id': region.id,
+            'nama': region.nama,
+            'level': region.level,
+            'latitude': region.latitude,
+            'longitude': region.longitude,
+            'ancestry': [{'id': r.id, 'nama': r.nama, 'level': r.level} for r in region.ancestry()[:-1]],
+        }
+
+def make_handler(index):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/search':
+                self._send(404, {'error': 'not found'})
+                return
+            params = parse_qs(url.query)
+            try:
+                limit = max(1, min(int(params.get('limit', [DEFAULT_LIMIT])[0]), MAX_LIMIT))
+            except ValueError:
+                self._send(400, {'error': 'limit must be a number'})
+                return
+            parent = params.get('parent', [None])[0]
+            if parent is not None and not (parent.isascii() and parent.isdigit()):
+                self._send(400, {'error': 'parent must be a region id'})
+                return
+            level = params.get('level', [None])[0]
+            if level is not None and level not in LEVEL_NAMES:
+                self._send(400, {'error': f"level must be one of {', '.join(LEVEL_NAMES)}"})
+                return
+
+            start = time.perf_counter()
+            results = index.search(params.get('q', [''])[0], limit, parent, level)
+            took = time.perf_counter() - start
+            self._send(200, results, {'X-Search-Time-Ms': f"{took * 1000:.3f}"})
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            # The static files cannot be fetched cross-domain; this can
+            self.send_header('Access-Control-Allow-Origin', '*')
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Local autocomplete server over the whole hierarchy.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = AutocompleteIndex(RegionRegistry.from_tree(args.base_dir))
+    print(f"Indexed {len(index)} regions in {time.perf_counter() - start:.1f}s.")
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(index))
+    print(f"Listening on http://{args.host}:{args.port}/search?q=...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
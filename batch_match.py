@@ -0,0 +1,308 @@
+import argparse
+import csv
+import difflib
+import os
+import re
+import time
+
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+from change_plan import apply_file_changes, open_plan, write_change
+from fix_names import CSV_PATH, is_kota, ngrams, normalize_csv_name, normalize_name
+from province_votes import ProvinceVoteIndex
+from tree_io import scan_level
+from wilayah import LEVELS, PROVINSI_FILE, parent_id, read_json, read_json_files
+
+# Batch kabupaten/kota matching: instead of looking up every JSON name on its
+# own (where two kabupaten can pick the same CSV entry), all names of a
+# reference province are scored against all its CSV names at once and then
+# paired one-to-one.
+#   - Similarity is the Dice coefficient of the character bigram sets of the
+#     normalized names (the ngrams() of fix_names.py), computed for the whole
+#     matrix with one product of the bigram incidence matrices.
+#   - Pairs of the wrong kind (a kota id with a Kabupaten name and the other
+#     way round) and pairs below the threshold score 0.
+#   - The pairing maximizes the total score (Hungarian algorithm; scipy's
+#     linear_sum_assignment when installed, a numpy version otherwise), and
+#     pairs that scored 0 are dropped, leaving those names unmatched.
+# JSON provinces are mapped to CSV provinces by name, or by their children's
+# names (province_votes.py) for the ones the CSV does not know, such as the
+# Papua splits; all JSON provinces mapped to one CSV province share its names.
+# Matched names are written cleaned (display_name); a CSV name carrying an
+# old or alternative form ("(d/h ...)", "/alias") is only reported for
+# review. The threshold is looser than fix_names.py's, so by default the
+# changes go to a plan for review, and --apply writes them in place.
+DICE_THRESHOLD = 0.6
+PLAN_PATH = 'batch_match.plan.jsonl'
+PROVINCE_NAME_CUTOFF = 0.8
+
+def load_reference_by_province(csv_path=CSV_PATH):
+    # {CSV province: [kab/kota names]}, placeholders left out
+    reference = {}
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) < 3:
+                continue
+            province, name = row[1].strip(), row[2].strip()
+            if "Kabupaten/Kota Lainnya" in name:
+                continue
+            reference.setdefault(province, []).append(name)
+    return reference
+
+def _fix_kota_typo(name):
+    # The CSV's odd "Kota. Bima"
+    return re.sub(r'^Kota\.\s*', 'Kota ', name.strip())
+
+def candidate_key(name):
+    return normalize_csv_name(_fix_kota_typo(name))
+
+def display_name(name):
+    # The CSV name as it goes into the tree: "Kota." fixed, and historical
+    # "(d/h ...)" and "/alias" annotations dropped
+    name = re.sub(r'\s*\(d/h[^)]*\)', '', _fix_kota_typo(name))
+    return re.sub(r'\s*/.*$', '', name).strip()
+
+def needs_review(name):
+    # Annotated CSV names ("Kabupaten Bintan (d/h Kabupaten Kepulauan Riau)",
+    # "Kota Surakarta/Solo", "... (Muara Enim)") are old or alternative forms,
+    # and the cleaned name may not be the current one, so they are not applied
+    return display_name(name) != _fix_kota_typo(name) or '(' in name
+
+def is_kota_name(name):
+    return re.match(r'(WIL\.\s*)?KOTA\b', name.strip().upper()) is not None
+
+def incidence(keys, vocabulary):
+    # Binary (len(keys), len(vocabulary)) matrix of the bigrams of each key
+    matrix = np.zeros((len(keys), len(vocabulary)), dtype=np.float32)
+    for row, key in enumerate(keys):
+        columns = [vocabulary[g] for g in ngrams(key)]
+        matrix[row, columns] = 1
+    return matrix
+
+def similarity_matrix(keys, candidate_keys):
+    # Dice coefficient of bigram sets for every (key, candidate key) pair
+    vocabulary = {}
+    for key in list(keys) + list(candidate_keys):
+        for gram in ngrams(key):
+            vocabulary.setdefault(gram, len(vocabulary))
+    a = incidence(keys, vocabulary)
+    b = incidence(candidate_keys, vocabulary)
+    shared = a @ b.T
+    sizes = a.sum(axis=1)[:, None] + b.sum(axis=1)[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(sizes > 0, 2 * shared / sizes, 0.0)
+    # Equal keys score 1 even when too short to have bigrams
+    scores[np.asarray(keys, dtype=object)[:, None] == np.asarray(candidate_keys, dtype=object)[None, :]] = 1.0
+    return scores
+
+def _hungarian(cost):
+    # Minimum cost assignment for a rows <= columns matrix, as (rows, columns).
+    # Shortest augmenting path with row/column potentials, O(rows^2 * columns).
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # row (1-based) assigned to each column
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        owner[0] = row
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            reduced = cost[owner[j0] - 1] - u[owner[j0]] - v[1:]
+            free = ~used[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            used_columns = np.nonzero(used)[0]
+            u[owner[used_columns]] += delta
+            v[used_columns] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if owner[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            owner[j0] = owner[j1]
+            j0 = j1
+    columns = np.nonzero(owner[1:])[0]
+    rows = owner[1:][columns] - 1
+    order = np.argsort(rows)
+    return rows[order], columns[order]
+
+def assign(scores):
+    # One-to-one (row, column) pairs maximizing the total score; pairs that
+    # score 0 are left out
+    if scores.size == 0:
+        return []
+    if linear_sum_assignment is not None:
+        rows, columns = linear_sum_assignment(scores, maximize=True)
+    elif scores.shape[0] <= scores.shape[1]:
+        rows, columns = _hungarian(-scores)
+    else:
+        columns, rows = _hungarian(-scores.T)
+    return [(int(r), int(c)) for r, c in zip(rows, columns) if scores[r, c] > 0]
+
+def match_batch(names, ids, candidates, threshold=DICE_THRESHOLD):
+    # Reference name (or None) for each JSON name, no two names sharing one.
+    # ids decide the kind: kota ids only pair with Kota names and the rest
+    # with Kabupaten names. Also returns how many names the one-to-one
+    # pairing moved away from their individually best candidate.
+    keys = [normalize_name(n) for n in names]
+    candidate_keys = [candidate_key(c) for c in candidates]
+    scores = similarity_matrix(keys, candidate_keys)
+
+    candidate_kota = np.array([is_kota_name(c) for c in candidates], dtype=bool)
+    name_kota = np.array([is_kota(i) for i in ids], dtype=bool)
+    if len(names) and len(candidates):
+        scores[name_kota[:, None] != candidate_kota[None, :]] = 0.0
+        scores[scores < threshold] = 0.0
+
+    result = [None] * len(names)
+    moved = 0
+    for row, column in assign(scores):
+        result[row] = candidates[column]
+        if scores[row, column] < scores[row].max():
+            moved += 1
+    return result, moved
+
+def map_provinces(provinces, reference, children):
+    # {JSON province id: CSV province}; provinces: {id: name},
+    # children: {province id: [kab/kota names]} for the vote fallback
+    mapping = {}
+    csv_provinces = list(reference)
+    for province_id, name in provinces.items():
+        found = difflib.get_close_matches(name, csv_provinces, n=1, cutoff=PROVINCE_NAME_CUTOFF)
+        if found:
+            mapping[province_id] = found[0]
+    votes = ProvinceVoteIndex(reference)
+    for province_id in provinces:
+        if province_id not in mapping and children.get(province_id):
+            best, _, _ = votes.infer(children[province_id])
+            if best is not None:
+                mapping[province_id] = best
+    return mapping
+
+def read_kabkota(base_dir='.'):
+    # {province id: [(id, nama)]} from the kabupaten/ list files
+    directory = os.path.join(base_dir, LEVELS['kabupaten']['dir'])
+    files = {entry.path: province_id for province_id, entry
+             in scan_level(directory, (LEVELS['kabupaten']['parent_len'],))}
+    regions = {}
+    for path, data in read_json_files(files):
+        province_id = files[path]
+        for entry in data:
+            region_id = str(entry.get('id', ''))
+            if len(region_id) == LEVELS['kabupaten']['id_len'] and entry.get('nama'):
+                regions.setdefault(province_id, []).append((region_id, entry['nama']))
+    return regions
+
+def reconcile(base_dir='.', csv_path=CSV_PATH, threshold=DICE_THRESHOLD):
+    # ({kab/kota id: cleaned reference name}, stats) for the whole country.
+    # stats['review'] lists the pairs whose CSV name is annotated; those are
+    # left out of the targets.
+    reference = load_reference_by_province(csv_path)
+    provinces = {str(p['id']): p['nama'] for p in read_json(os.path.join(base_dir, PROVINSI_FILE))}
+    regions = read_kabkota(base_dir)
+    mapping = map_provinces(provinces, reference,
+                            {p: [name for _, name in rows] for p, rows in regions.items()})
+
+    # JSON provinces sharing a CSV province are paired together
+    groups = {}
+    for province_id in sorted(regions):
+        if province_id in mapping:
+            groups.setdefault(mapping[province_id], []).extend(regions[province_id])
+
+    targets = {}
+    stats = {'names': 0, 'matched': 0, 'moved': 0, 'review': [],
+             'unmapped': sorted(p for p in regions if p not in mapping)}
+    for csv_province, rows in groups.items():
+        ids = [region_id for region_id, _ in rows]
+        names = [name for _, name in rows]
+        matches, moved = match_batch(names, ids, reference[csv_province], threshold)
+        stats['names'] += len(rows)
+        stats['moved'] += moved
+        for region_id, name, match in zip(ids, names, matches):
+            if match is None:
+                continue
+            stats['matched'] += 1
+            if needs_review(match):
+                stats['review'].append({'id': region_id, 'nama': name, 'csv': match,
+                                        'suggested': display_name(match)})
+            else:
+                targets[region_id] = display_name(match)
+    return targets, stats
+
+def file_changes(base_dir, targets):
+    # {path: {id: (current name, target name)}} over every file holding a
+    # kab/kota (list and record files, kabupaten/ and its kota/ mirror)
+    changes = {}
+    paths = set()
+    for region_id in targets:
+        for level in ('kabupaten', 'kota'):
+            directory = os.path.join(base_dir, LEVELS[level]['dir'])
+            paths.add(os.path.join(directory, f"{parent_id(region_id)}.json"))
+            paths.add(os.path.join(directory, f"{region_id}.json"))
+    existing = [path for path in sorted(paths) if os.path.exists(path)]
+    for path, data in read_json_files(existing):
+        for entry in data if isinstance(data, list) else [data]:
+            if not isinstance(entry, dict):
+                continue
+            target = targets.get(str(entry.get('id', '')))
+            if target is not None and entry.get('nama') != target:
+                changes.setdefault(path, {})[str(entry['id'])] = (entry.get('nama'), target)
+    return changes
+
+def main():
+    parser = argparse.ArgumentParser(description="Match all kabupaten/kota names one-to-one against the CSV reference.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--csv', default=CSV_PATH, help=f"reference CSV (default: {CSV_PATH})")
+    parser.add_argument('--threshold', type=float, default=DICE_THRESHOLD,
+                        help=f"minimum bigram Dice score of a pair (default: {DICE_THRESHOLD})")
+    parser.add_argument('--plan', metavar='PATH', default=PLAN_PATH,
+                        help=f"JSONL plan to write the changes to, for review and change_plan.py "
+                             f"(default: {PLAN_PATH})")
+    parser.add_argument('--apply', action='store_true',
+                        help="rewrite the files in place instead of writing a plan")
+    args = parser.parse_args()
+
+    csv_path = os.path.join(args.base_dir, args.csv)
+    if not os.path.exists(csv_path):
+        print("CSV Reference not found!")
+        return
+
+    start = time.perf_counter()
+    targets, stats = reconcile(args.base_dir, csv_path, args.threshold)
+    print(f"Matched {stats['matched']} of {stats['names']} kab/kota names "
+          f"({stats['moved']} moved off their best candidate to keep the pairing one-to-one).")
+    if stats['unmapped']:
+        print(f"No CSV province for {', '.join(stats['unmapped'])}.")
+    for item in stats['review']:
+        print(f"[{item['id']}] Review: {item['nama']!r} matched the annotated CSV name {item['csv']!r} "
+              f"(cleaned: {item['suggested']!r}), not changed")
+
+    changes = file_changes(args.base_dir, targets)
+    updates = sum(len(c) for c in changes.values())
+    if not args.apply:
+        with open_plan(args.plan) as plan:
+            for path, by_id in changes.items():
+                for region_id, (old_name, new_name) in by_id.items():
+                    write_change(plan, os.path.relpath(path, args.base_dir), region_id, old_name, new_name)
+        print(f"Planned {updates} updates in {len(changes)} files; plan written to {args.plan}")
+    else:
+        for path, by_id in changes.items():
+            apply_file_changes(path, by_id)
+        print(f"Updated {updates} names in {len(changes)} files.")
+    print(f"Done in {time.perf_counter() - start:.2f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import fix_names
+from wilayah import PROPINSI_FILE, PROVINSI_FILE
+
+# Benchmark the name reconciliation stages of fix_names.py.
+# Every stage runs in a fresh (spawned) process against a scratch copy of the
+# tree, so the tree is never modified and peak RSS is per stage. Trees larger
+# than the real one are generated by copying the kabupaten/kota record files
+# under new filenames with perturbed names, so matching has work to do.
+#
+# Output is one JSON document:
+#   {"python": ..., "results": [{"stage", "scale", "wall_s", "calls", "files",
+#    "files_per_s", "comparisons", "peak_rss_kb"}, ...]}
+STAGES = ['load_csv_reference', 'normalize_name', 'find_best_match',
+          'process_provinces', 'process_file_list']
+
+DEFAULT_SCALES = [1, 10, 100]
+
+def _perturb(name, rnd):
+    # Variants the fixers have to undo: old style prefixes, upper case, typos
+    choice = rnd.randrange(4)
+    if choice == 0:
+        return name.upper().replace('KABUPATEN ', 'KAB. ')
+    if choice == 1:
+        return name.upper()
+    if choice == 2 and len(name) > 6:
+        i = rnd.randrange(len(name))
+        return name[:i] + name[i + 1:]
+    return name
+
+def generate_tree(source_dir, target_dir, scale, seed=0):
+    # Copy of the tree with the kabupaten/kota record files multiplied by scale
+    rnd = random.Random(seed)
+    os.makedirs(os.path.join(target_dir, 'referensi'), exist_ok=True)
+    shutil.copy(os.path.join(source_dir, fix_names.CSV_PATH), os.path.join(target_dir, fix_names.CSV_PATH))
+    for pfile in (PROVINSI_FILE, PROPINSI_FILE):
+        shutil.copy(os.path.join(source_dir, pfile), os.path.join(target_dir, pfile))
+
+    for directory in (fix_names.DIR_KABUPATEN, fix_names.DIR_KOTA):
+        src = os.path.join(source_dir, directory)
+        dst = os.path.join(target_dir, directory)
+        os.makedirs(dst, exist_ok=True)
+        for filename in sorted(os.listdir(src)):
+            if not filename.endswith('.json'):
+                continue
+            shutil.copy(os.path.join(src, filename), os.path.join(dst, filename))
+            if scale <= 1:
+                continue
+            with open(os.path.join(src, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for copy in range(1, scale):
+                if isinstance(data, dict) and data.get('nama'):
+                    record = dict(data, nama=_perturb(data['nama'], rnd))
+                else:
+                    record = data
+                with open(os.path.join(dst, f"{filename[:-5]}_{copy}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(record, f)
+
+def _sample_names(tree_dir):
+    names = []
+    for directory in (fix_names.DIR_KABUPATEN, fix_names.DIR_KOTA):
+        directory = os.path.join(tree_dir, directory)
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('nama'):
+                names.append((data.get('id', ''), data['nama']))
+    return names
+
+def _count_files(tree_dir):
+    return sum(len([f for f in os.listdir(os.path.join(tree_dir, d)) if f.endswith('.json')])
+               for d in (fix_names.DIR_KABUPATEN, fix_names.DIR_KOTA))
+
+def run_stage(stage, tree_dir, workers):
+    # Runs in a spawned child; cwd is the scratch tree because the fixer
+    # uses relative paths.
+    os.chdir(tree_dir)
+    files = None
+    calls = 1
+    sink = io.StringIO()
+
+    if stage in ('normalize_name', 'find_best_match'):
+        provinces, kabkota = fix_names.load_csv_reference(fix_names.CSV_PATH)
+        names = _sample_names(tree_dir)
+        indexes = fix_names.build_kabkota_indexes(kabkota)
+    elif stage in ('process_provinces', 'process_file_list'):
+        provinces, kabkota = fix_names.load_csv_reference(fix_names.CSV_PATH)
+        files = _count_files(tree_dir) if stage == 'process_file_list' else 2
+
+    fix_names.MATCH_STATS['comparisons'] = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        if stage == 'load_csv_reference':
+            fix_names.load_csv_reference(fix_names.CSV_PATH)
+        elif stage == 'normalize_name':
+            for _, name in names:
+                fix_names.normalize_name(name)
+            calls = len(names)
+        elif stage == 'find_best_match':
+            for region_id, name in names:
+                index = indexes[fix_names.is_kota(region_id)]
+                fix_names.find_best_match(name, index['candidates'], fix_names.MATCH_THRESHOLD, index=index)
+            calls = len(names)
+        elif stage == 'process_provinces':
+            fix_names.process_provinces(provinces)
+        elif stage == 'process_file_list':
+            indexes = fix_names.build_kabkota_indexes(kabkota)
+            fix_names.process_file_list(fix_names.DIR_KABUPATEN, kabkota, indexes, workers=workers,
+                                        mirrors=[fix_names.DIR_KOTA])
+    wall = time.perf_counter() - start
+
+    # Worker processes (--workers) are children of this process
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return {
+        'stage': stage,
+        'wall_s': round(wall, 6),
+        'calls': calls,
+        'files': files,
+        'files_per_s': round(files / wall, 1) if files and wall else None,
+        'comparisons': fix_names.MATCH_STATS['comparisons'],
+        'peak_rss_kb': peak,
+    }
+
+def run_benchmarks(source_dir, scales, stages, workers=1):
+    results = []
+    ctx = multiprocessing.get_context('spawn')
+    for scale in scales:
+        with tempfile.TemporaryDirectory(prefix=f'bench-x{scale}-') as base:
+            tree_dir = os.path.join(base, 'tree')
+            print(f"Generating x{scale} tree...", file=sys.stderr)
+            generate_tree(source_dir, tree_dir, scale)
+            for stage in stages:
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(run_stage, (stage, tree_dir, workers))
+                result['scale'] = scale
+                result['workers'] = workers
+                print(f"x{scale} {stage}: {result['wall_s']:.3f}s", file=sys.stderr)
+                results.append(result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the name reconciliation pipeline.")
+    parser.add_argument('--source', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help="comma separated tree size multipliers (default: 1,10,100)")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help="comma separated stages to run (default: all)")
+    parser.add_argument('--workers', type=int, default=1, help="--workers for process_file_list")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(',')]
+    stages = [s for s in args.stages.split(',') if s]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"unknown stage {stage}")
+
+    report = {
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'results': run_benchmarks(os.path.abspath(args.source), scales, stages, args.workers),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np  # pip install numpy
+
+from region_registry import RegionRegistry
+from spatial_index import EARTH_RADIUS_KM
+from wilayah_db import iter_rows
+
+# Batch reverse geocoding: arrays of GPS points -> nearest kelurahan ids.
+# The kelurahan coordinates become one (n, 3) matrix of unit vectors. On a
+# sphere the nearest point by haversine is the one with the largest dot
+# product, so each chunk of query points is one matrix product and an argmax;
+# the haversine distance is then computed only for the winners. Chunks are
+# sized so the (chunk, n) product stays under CHUNK_BYTES (small enough to
+# stay cache friendly; larger chunks are slower), and blocks of
+# chunks can be spread over a process pool.
+CHUNK_BYTES = 16 * 1024 * 1024
+
+# Returned for points that are NaN/inf
+NO_ID = -1
+
+def unit_vectors(lat, lon):
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    # Element-wise haversine over arrays, in km
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+class KelurahanGeocoder:
+    def __init__(self, ids, latitude, longitude):
+        ids = np.asarray(ids, dtype=np.int64)
+        latitude = np.asarray(latitude, dtype=np.float64)
+        longitude = np.asarray(longitude, dtype=np.float64)
+        # Kelurahan without coordinates are stored as 0, 0
+        known = (latitude != 0) | (longitude != 0)
+        self.ids = ids[known]
+        self.latitude = latitude[known]
+        self.longitude = longitude[known]
+        self._vectors = unit_vectors(self.latitude, self.longitude)
+
+    @classmethod
+    def from_tree(cls, base_dir='.'):
+        # Built from the kelurahan list files only
+        columns = RegionRegistry(iter_rows(base_dir, 'kelurahan')).columns('kelurahan')
+        return cls(np.frombuffer(columns['ids'], dtype=np.int64),
+                   np.frombuffer(columns['latitude'], dtype=np.float64),
+                   np.frombuffer(columns['longitude'], dtype=np.float64))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def chunk_rows(self, chunk_bytes=CHUNK_BYTES):
+        # Query points per chunk so the dot product matrix fits chunk_bytes
+        return max(1, chunk_bytes // (8 * max(1, len(self.ids))))
+
+    def _nearest_chunk(self, lat, lon):
+        dots = unit_vectors(lat, lon) @ self._vectors.T
+        best = np.argmax(dots, axis=1)
+        return best, haversine_km(lat, lon, self.latitude[best], self.longitude[best])
+
+    def nearest_positions(self, lat, lon, chunk_bytes=CHUNK_BYTES):
+        # (positions into self.ids, distances km); position -1 for invalid points
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        if lat.shape != lon.shape:
+            raise ValueError("latitude and longitude must have the same length")
+        positions = np.full(len(lat), NO_ID, dtype=np.int64)
+        distances = np.full(len(lat), np.nan)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        if not len(self.ids):
+            return positions, distances
+
+        step = self.chunk_rows(chunk_bytes)
+        for start in range(0, len(valid), step):
+            rows = valid[start:start + step]
+            positions[rows], distances[rows] = self._nearest_chunk(lat[rows], lon[rows])
+        return positions, distances
+
+    def reverse_geocode(self, lat, lon, chunk_bytes=CHUNK_BYTES, workers=1):
+        # (kelurahan ids int64, distances km float64), one per input point;
+        # NO_ID / NaN where the point is not a finite coordinate
+        lat = np.asarray(lat, dtype=np.float64).ravel()
+        lon = np.asarray(lon, dtype=np.float64).ravel()
+        if workers > 1 and len(lat) > self.chunk_rows(chunk_bytes):
+            positions, distances = self._parallel(lat, lon, chunk_bytes, workers)
+        else:
+            positions, distances = self.nearest_positions(lat, lon, chunk_bytes)
+        if not len(self.ids):
+            return positions, distances
+        ids = np.where(positions >= 0, self.ids[np.maximum(positions, 0)], NO_ID)
+        return ids, distances
+
+    def _parallel(self, lat, lon, chunk_bytes, workers):
+        # A few blocks per worker, each a whole number of chunks, merged in order
+        step = self.chunk_rows(chunk_bytes)
+        block = max(step, -(-len(lat) // (workers * 4) // step) * step)
+        bounds = range(0, len(lat), block)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.ids, self.latitude, self.longitude)) as pool:
+            parts = list(pool.map(_geocode_block,
+                                  (lat[s:s + block] for s in bounds),
+                                  (lon[s:s + block] for s in bounds),
+                                  [chunk_bytes] * len(bounds)))
+        return (np.concatenate([p[0] for p in parts]),
+                np.concatenate([p[1] for p in parts]))
+
+_worker_geocoder = None
+
+def _init_worker(ids, latitude, longitude):
+    global _worker_geocoder
+    _worker_geocoder = KelurahanGeocoder(ids, latitude, longitude)
+
+def _geocode_block(lat, lon, chunk_bytes):
+    return _worker_geocoder.nearest_positions(lat, lon, chunk_bytes)
+
+def reverse_geocode(lat, lon, base_dir='.', chunk_bytes=CHUNK_BYTES, workers=1):
+    # One-off convenience; keep a KelurahanGeocoder around for repeated batches
+    return KelurahanGeocoder.from_tree(base_dir).reverse_geocode(lat, lon, chunk_bytes, workers)
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest kelurahan for every point of a CSV file.")
+    parser.add_argument('input', help="CSV file with a header row")
+    parser.add_argument('output', help="CSV file to write: the input columns plus kelurahan_id, distance_km")
+    parser.add_argument('--lat-column', default='latitude')
+    parser.add_argument('--lon-column', default='longitude')
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes (default: 1)")
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_BYTES // (1024 * 1024),
+                        help="memory per vectorized chunk (default: %(default)s)")
+    args = parser.parse_args()
+
+    with open(args.input, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    def column(name):
+        values = np.full(len(rows), np.nan)
+        for i, row in enumerate(rows):
+            try:
+                values[i] = float(row[name])
+            except (TypeError, ValueError):
+                pass
+        return values
+
+    geocoder = KelurahanGeocoder.from_tree(args.base_dir)
+    start = time.perf_counter()
+    ids, distances = geocoder.reverse_geocode(column(args.lat_column), column(args.lon_column),
+                                              args.chunk_mb * 1024 * 1024, args.workers)
+    took = time.perf_counter() - start
+
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames + ['kelurahan_id', 'distance_km'])
+        writer.writeheader()
+        for row, region_id, distance in zip(rows, ids, distances):
+            found = region_id != NO_ID
+            row['kelurahan_id'] = str(region_id) if found else ''
+            row['distance_km'] = f"{distance:.3f}" if found else ''
+            writer.writerow(row)
+
+    print(f"Geocoded {len(rows)} points against {len(geocoder)} kelurahan in {took:.2f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import time
+
+from change_plan import write_text_atomic
+from export import _number
+from region_registry import CHILD_LEVEL, RegionRegistry
+
+# One-file bundles of a whole subtree, so a client can pick a kelurahan after a
+# single download instead of the provinsi -> kabupaten -> kecamatan ->
+# kelurahan cascade in contoh.html. bundle/11.json holds Aceh and everything
+# under it; with --kabupaten, bundle/1101.json holds one kabupaten.
+#
+# Each level is stored in columns, in id order:
+#   {"id": "11", "nama": "Aceh", "latitude": ..., "longitude": ...,
+#    "kabupaten": {"id": [...], "nama": [...], "latitude": [...], "longitude": [...],
+#                  "children": [0, 23, 41, ...]},
+#    "kecamatan": {..., "children": [...]},
+#    "kelurahan": {"id": [...], "nama": [...], "latitude": [...], "longitude": [...]}}
+# "children" has one more entry than the level: the children of row i are rows
+# children[i] to children[i + 1] - 1 of the next level. The root's own
+# children are all rows of its first level.
+OUTPUT_DIR = 'bundle'
+
+def level_columns(registry, level, start, stop, next_range=None):
+    columns = registry.columns(level)
+    names = registry.name_table()
+    ids = columns['ids'][start:stop]
+    block = {
+        'id': [str(i) for i in ids],
+        'nama': [names[n] for n in columns['names'][start:stop]],
+        'latitude': [_number(v) for v in columns['latitude'][start:stop]],
+        'longitude': [_number(v) for v in columns['longitude'][start:stop]],
+    }
+    if next_range is not None:
+        # Offsets of each row's children within the next level's slice
+        child_level, child_start = next_range
+        offsets = [registry.descendant_range(str(region_id), child_level)[0] - child_start
+                   for region_id in ids]
+        offsets.append(registry.descendant_range(str(ids[-1]), child_level)[1] - child_start
+                       if len(ids) else 0)
+        block['children'] = offsets
+    return block
+
+def build_bundle(registry, region):
+    bundle = region.to_dict()
+    bundle['latitude'] = _number(bundle['latitude'])
+    bundle['longitude'] = _number(bundle['longitude'])
+
+    level = CHILD_LEVEL[region.level]
+    while level is not None:
+        start, stop = registry.descendant_range(region.id, level)
+        child_level = CHILD_LEVEL.get(level)
+        next_range = None
+        if child_level is not None:
+            next_range = (child_level, registry.descendant_range(region.id, child_level)[0])
+        bundle[level] = level_columns(registry, level, start, stop, next_range)
+        level = child_level
+    return bundle
+
+def write_bundles(registry, output_dir=OUTPUT_DIR, levels=('provinsi',)):
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+    total_bytes = 0
+    for level in levels:
+        for region in registry.iter_level(level):
+            text = json.dumps(build_bundle(registry, region), ensure_ascii=False, separators=(',', ':'))
+            write_text_atomic(os.path.join(output_dir, f"{region.id}.json"), text)
+            written += 1
+            total_bytes += len(text.encode('utf-8'))
+    return written, total_bytes
+
+def main():
+    parser = argparse.ArgumentParser(description="Write one columnar bundle per province (and kabupaten).")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--output', default=OUTPUT_DIR, help=f"directory for the bundles (default: {OUTPUT_DIR})")
+    parser.add_argument('--kabupaten', action='store_true', help="also write one bundle per kabupaten/kota")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    registry = RegionRegistry.from_tree(args.base_dir)
+    levels = ('provinsi', 'kabupaten') if args.kabupaten else ('provinsi',)
+    written, total_bytes = write_bundles(registry, args.output, levels)
+    print(f"Wrote {written} bundles ({total_bytes / 1e6:.1f} MB) to {args.output} "
+          f"in {time.perf_counter() - start:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import tempfile
+
+from instrumentation import count
+
+# A change plan is a JSONL file with one record per name change:
+#   {"file": "kota/3371.json", "id": "3371", "old": "KOTA MAGELANG", "new": "Kota Magelang"}
+# The fixer scripts write it in --plan mode without touching the tree,
+# and this script applies a reviewed plan in one pass.
+
+def open_plan(path):
+    return open(path, 'w', encoding='utf-8')
+
+def write_change(plan, file_path, region_id, old_name, new_name):
+    record = {'file': file_path, 'id': region_id, 'old': old_name, 'new': new_name}
+    plan.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def read_plan(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def group_by_file(changes):
+    # file -> {id: (old, new)}, in the order files first appear in the plan
+    grouped = {}
+    for change in changes:
+        grouped.setdefault(change['file'], {})[change['id']] = (change['old'], change['new'])
+    return grouped
+
+def dumps_like(data, original_text):
+    # Keep the layout the file already has: indent=2 for the multiline files
+    # written by the Python fixers, PHP's compact json_encode for the rest,
+    # and the final newline if there was one.
+    newline = '\n' if original_text.endswith('\n') else ''
+    if '\n' in original_text.strip():
+        return json.dumps(data, indent=2) + newline
+    if '":"' in original_text or '","' in original_text:
+        text = json.dumps(data, separators=(',', ':'))
+        if '\\/' in original_text:
+            # json_encode escapes slashes
+            text = text.replace('/', '\\/')
+        return text + newline
+    return json.dumps(data) + newline
+
+def write_text_atomic(path, text):
+    write_atomic(path, text)
+
+def write_atomic(path, content):
+    # Write to a temp file in the same directory, then rename over the target,
+    # so readers never see a half-written file. content is str or bytes.
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        if isinstance(content, bytes):
+            with os.fdopen(fd, 'wb') as f:
+                f.write(content)
+                size = f.tell()
+        else:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+                size = f.tell()
+        # mkstemp creates 0600 files; keep the mode the target had
+        try:
+            mode = os.stat(path).st_mode & 0o777
+        except FileNotFoundError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    count(files_written=1, bytes_written=size)
+
+def apply_file_changes(path, changes):
+    # Returns (applied, stale) counts for one file. A change is stale when
+    # the current name is no longer the planned old name.
+    with open(path, 'r', encoding='utf-8') as f:
+        original_text = f.read()
+    data = json.loads(original_text)
+
+    entries = data if isinstance(data, list) else [data]
+    applied = 0
+    stale = 0
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        change = changes.get(entry.get('id'))
+        if change is None:
+            continue
+        old_name, new_name = change
+        if entry.get('nama') == new_name:
+            continue
+        if entry.get('nama') != old_name:
+            stale += 1
+            continue
+        entry['nama'] = new_name
+        applied += 1
+
+    if applied:
+        write_text_atomic(path, dumps_like(data, original_text))
+    return applied, stale
+
+def apply_plan(plan_path, base_dir='.'):
+    files_written = 0
+    applied_total = 0
+    stale_total = 0
+    for file_path, changes in group_by_file(read_plan(plan_path)).items():
+        path = os.path.join(base_dir, file_path)
+        if not os.path.exists(path):
+            print(f"[{file_path}] Missing, skipped {len(changes)} changes")
+            continue
+        applied, stale = apply_file_changes(path, changes)
+        if stale:
+            print(f"[{file_path}] {stale} stale changes skipped")
+        if applied:
+            files_written += 1
+            applied_total += applied
+        stale_total += stale
+
+    print(f"Applied {applied_total} changes to {files_written} files ({stale_total} stale).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a reviewed name change plan to the tree.")
+    parser.add_argument('plan', help="JSONL plan written by a fixer script in --plan mode")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    args = parser.parse_args()
+
+    apply_plan(args.plan, args.base_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import sqlite3
+
+from tree_io import write_files
+from wilayah import PROPINSI_FILE, PROVINSI_FILE
+from wilayah_db import DB_PATH
+
+# Python replacement for export.php.
+# export.php runs one "id LIKE 'parent%'" query per province, kota and
+# kecamatan (~8k queries) and writes every file synchronously. Here each level
+# is read with a single ordered query, children are grouped by id prefix in
+# memory, and the files are written from a thread pool (tree_io.py). The
+# layout and the json_encode formatting are the same as export.php's.
+
+# Same settings as export.php / lokasi.php
+MYSQL_CONFIG = {
+    'host': 'localhost',
+    'database': 'wilayah_indonesia',
+    'user': 'wilayah',
+    'password': 'indonesia',
+}
+
+# level -> table name per source
+TABLES = {
+    'sqlite': {'provinsi': 'provinsi', 'kota': 'kabupaten', 'kecamatan': 'kecamatan', 'kelurahan': 'kelurahan'},
+    'mysql': {'provinsi': 't_provinsi', 'kota': 't_kota', 'kecamatan': 't_kecamatan', 'kelurahan': 't_kelurahan'},
+}
+
+def php_json_encode(value):
+    # json_encode() defaults: compact, \uXXXX for non-ASCII, escaped slashes
+    return json.dumps(value, separators=(',', ':')).replace('/', '\\/')
+
+def connect_sqlite(db_path=DB_PATH):
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+def connect_mysql(**overrides):
+    # Needs PyMySQL (pip install pymysql); any MySQL-compatible server works
+    import pymysql
+    return pymysql.connect(**dict(MYSQL_CONFIG, **overrides), charset='utf8mb4')
+
+def _number(value):
+    # Missing coordinates are stored as 0 and published as 0, but a REAL
+    # column hands them back as 0.0
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def fetch_level(conn, table):
+    # All rows of one level in id order, as dicts with export.php's keys
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id, nama, latitude, longitude FROM {table} ORDER BY id")
+    rows = [{'id': str(region_id), 'nama': nama, 'latitude': _number(lat), 'longitude': _number(lon)}
+            for region_id, nama, lat, lon in cursor.fetchall()]
+    cursor.close()
+    return rows
+
+def group_by_prefix(rows, prefix_len):
+    # parent id -> children, keeping id order
+    groups = {}
+    for row in rows:
+        groups.setdefault(row['id'][:prefix_len], []).append(row)
+    return groups
+
+def iter_files(provinces, kota, kecamatan, kelurahan):
+    # (relative path, content) for every file export.php writes
+    encoded = php_json_encode(provinces)
+    yield PROVINSI_FILE, encoded
+    yield PROPINSI_FILE, encoded
+
+    kota_by_prov = group_by_prefix(kota, 2)
+    kec_by_kota = group_by_prefix(kecamatan, 4)
+    kel_by_kec = group_by_prefix(kelurahan, 6)
+
+    # Parent list files; every parent gets one, even when it has no children
+    for p in provinces:
+        children = kota_by_prov.get(p['id'], [])
+        encoded = php_json_encode(children)
+        yield f"kota/{p['id']}.json", encoded
+        yield f"kabupaten/{p['id']}.json", encoded
+        for k in children:
+            yield f"kecamatan/{k['id']}.json", php_json_encode(kec_by_kota.get(k['id'], []))
+            for kec in kec_by_kota.get(k['id'], []):
+                yield f"kelurahan/{kec['id']}.json", php_json_encode(kel_by_kec.get(kec['id'], []))
+
+    # Per-id record files
+    for d in kota:
+        encoded = php_json_encode(d)
+        yield f"kota/{d['id']}.json", encoded
+        yield f"kabupaten/{d['id']}.json", encoded
+    for d in kecamatan:
+        yield f"kecamatan/{d['id']}.json", php_json_encode(d)
+    for d in kelurahan:
+        yield f"kelurahan/{d['id']}.json", php_json_encode(d)
+
+def export_tree(conn, tables, output_dir='.', workers=16):
+    levels = {level: fetch_level(conn, table) for level, table in tables.items()}
+    for level, rows in levels.items():
+        print(f"{level}: {len(rows)} rows")
+
+    for directory in ('kota', 'kabupaten', 'kecamatan', 'kelurahan'):
+        os.makedirs(os.path.join(output_dir, directory), exist_ok=True)
+
+    files = iter_files(levels['provinsi'], levels['kota'], levels['kecamatan'], levels['kelurahan'])
+    written = write_files(((os.path.join(output_dir, rel_path), content) for rel_path, content in files),
+                          workers)
+
+    print(f"Wrote {written} files to {output_dir}.")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the tree from SQLite or MySQL (replaces export.php).")
+    parser.add_argument('--source', choices=['sqlite', 'mysql'], default='sqlite')
+    parser.add_argument('--db', default=DB_PATH, help=f"SQLite file for --source sqlite (default: {DB_PATH})")
+    parser.add_argument('--host', default=MYSQL_CONFIG['host'], help="MySQL host for --source mysql")
+    parser.add_argument('--output', default='.', help="root of the tree to write (default: .)")
+    parser.add_argument('--workers', type=int, default=16, help="writer threads (default: 16)")
+    args = parser.parse_args()
+
+    if args.source == 'sqlite':
+        if not os.path.exists(args.db):
+            print(f"{args.db} not found, build it with wilayah_db.py first.")
+            return
+        conn = connect_sqlite(args.db)
+    else:
+        conn = connect_mysql(host=args.host)
+
+    try:
+        export_tree(conn, TABLES[args.source], args.output, args.workers)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+import argparse
+import csv
+import os
+import re
+from collections import OrderedDict
+
+from change_plan import apply_file_changes, open_plan, write_change
+from fix_names import build_match_index, find_indexed_match
+from instrumentation import COUNTERS, RunReport, add_arguments
+from manifest import (file_unchanged, forget_file, load_manifest, record_file,
+                      save_manifest, settings_hash)
+from match_cache import MISS, MatchCache, candidates_hash
+from tree_io import read_files, scan_level
+from wilayah import LEVELS, parent_id, parse_json
+
+# Reconcile kecamatan and kelurahan names against a reference list.
+# The tree is processed as a stream: scan -> parse -> match -> emit, one file
+# at a time, so memory stays bounded by the reference plus the few files
+# tree_io.py reads ahead. A record takes the name of the reference entry with
+# its own kode wilayah; only ids the reference does not have are fuzzy
+# matched, against the reference entries of the same parent (kecamatan within
+# their kabupaten, kelurahan within their kecamatan) whose ids are not in the
+# tree. A reference entry whose id the tree has is that record's name, so
+# handing it to another record would only duplicate a sibling's name.
+#
+# The reference is not part of the repository. It is the Kemendagri list of
+# kode dan data wilayah administrasi pemerintahan (published with the
+# Kepmendagri that updates the codes), saved as a CSV of "kode, nama" rows
+# for every kecamatan and kelurahan/desa, with or without the dots in the
+# code:
+#   11.01.01, Bakongan
+#   11.01.01.2001, Keude Bakongan
+# Put it at referensi/master_kecamatan_kelurahan.csv or pass --reference.
+REFERENCE_PATH = 'referensi/master_kecamatan_kelurahan.csv'
+MANIFEST_PATH = '.fix_levels_manifest.json'
+LEVEL_NAMES = ['kecamatan', 'kelurahan']
+
+# Parent groups kept indexed at once; files are scanned in id order so
+# siblings arrive together and a small window is enough.
+INDEX_CACHE_SIZE = 8
+
+def normalize_region_name(name):
+    # Case, punctuation and spacing differences are not name differences
+    COUNTERS['normalize_calls'] += 1
+    name = name.upper()
+    name = re.sub(r'[.\-/]', ' ', name)
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name
+
+def load_reference(csv_path, id_lengths):
+    # Reference rows: kode wilayah, nama (e.g. "11.01.01.2001, Keude Bakongan").
+    # Dots in the code are ignored. Returns {parent id: {id: name}} for the
+    # requested id lengths.
+    groups = {}
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if len(row) < 2:
+                continue
+            region_id = re.sub(r'[^0-9]', '', row[0])
+            name = row[1].strip()
+            if not name or len(region_id) not in id_lengths:
+                continue
+            groups.setdefault(parent_id(region_id), {})[region_id] = name
+    return groups
+
+def scan(directory, level):
+    # Record files ([id].json) and list files ([parent id].json) of a level
+    spec = LEVELS[level]
+    for _, entry in scan_level(directory, (spec['id_len'], spec['parent_len'])):
+        yield entry.path
+
+def tree_ids(directory, id_len):
+    # {parent id: set of ids} of the record files in directory, from the
+    # file names alone
+    ids = {}
+    for region_id, _ in scan_level(directory, (id_len,)):
+        ids.setdefault(parent_id(region_id), set()).add(region_id)
+    return ids
+
+def skip_unchanged(paths, manifest, stats):
+    for path in paths:
+        if file_unchanged(manifest, path):
+            stats['skipped'] += 1
+        else:
+            yield path
+
+def parse(paths, manifest=None):
+    # (path, entries) per readable file; record files become one entry.
+    # Parsed files are recorded in the manifest as they go; the emit step
+    # corrects the entry for files it changes. Files are read ahead from a
+    # thread pool and come out in scan order.
+    for path, raw in read_files(paths, return_exceptions=True):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            data = parse_json(raw)
+        except Exception as e:
+            print(f"[{path}] Error reading: {e}")
+            if manifest is not None:
+                forget_file(manifest, path)
+            continue
+        if manifest is not None:
+            record_file(manifest, path, raw)
+        entries = data if isinstance(data, list) else [data]
+        yield path, [e for e in entries if isinstance(e, dict)]
+
+def match(parsed, reference, id_len, threshold=0.8, stats=None, cache=None, taken=None):
+    # (path, {id: (old, new)}) for files with at least one name to change
+    # cache: optional MatchCache; a hit does not even need the parent's index
+    # taken: optional {parent id: set of ids} already in the tree (see
+    # tree_ids); ids of the parsed entries are added as they come. Reference
+    # entries with those ids are left out of the fuzzy match.
+    indexes = OrderedDict()
+    hashes = {}
+    taken = taken if taken is not None else {}
+
+    def free_names(parent):
+        used = taken.get(parent, ())
+        return [name for region_id, name in reference[parent].items() if region_id not in used]
+
+    def index_for(parent):
+        if parent in indexes:
+            indexes.move_to_end(parent)
+            return indexes[parent]
+        index = build_match_index(free_names(parent), normalize_region_name)
+        indexes[parent] = index
+        if len(indexes) > INDEX_CACHE_SIZE:
+            indexes.popitem(last=False)
+        return index
+
+    def hash_for(parent):
+        if parent not in hashes:
+            hashes[parent] = candidates_hash(free_names(parent), normalize_region_name)
+        return hashes[parent]
+
+    for path, entries in parsed:
+        # List files come before their children's record files in scan
+        # order, so a parent's ids are all known before its index is built
+        for entry in entries:
+            region_id = str(entry.get('id', ''))
+            if len(region_id) == id_len:
+                taken.setdefault(parent_id(region_id), set()).add(region_id)
+        changes = {}
+        for entry in entries:
+            region_id = str(entry.get('id', ''))
+            name = entry.get('nama', '')
+            if len(region_id) != id_len or not name:
+                continue
+            if stats is not None:
+                stats['checked'] += 1
+            parent = parent_id(region_id)
+            if not reference.get(parent):
+                if stats is not None:
+                    stats['no_reference'] += 1
+                continue
+            # The reference entry with the same kode wilayah is the name;
+            # siblings are only searched for ids the reference does not have,
+            # and only those that no other record of the tree owns
+            best = reference[parent].get(region_id)
+            if best is not None:
+                if stats is not None:
+                    stats['by_id'] += 1
+                if best != name:
+                    changes[region_id] = (name, best)
+                continue
+            norm_name = normalize_region_name(name)
+            best = MISS
+            if cache is not None:
+                best = cache.get(hash_for(parent), threshold, norm_name)
+            if best is MISS:
+                best = find_indexed_match(norm_name, index_for(parent), threshold)
+                if cache is not None:
+                    cache.put(hash_for(parent), threshold, norm_name, best)
+            if best is None:
+                if stats is not None:
+                    stats['unmatched'] += 1
+                continue
+            if best != name:
+                changes[region_id] = (name, best)
+        if changes:
+            yield path, changes
+
+def reconcile_level(level, reference, threshold=0.8, plan=None, manifest=None, cache=None):
+    spec = LEVELS[level]
+    directory = spec['dir']
+    if not os.path.exists(directory):
+        print(f"Directory {directory} does not exist.")
+        return
+
+    print(f"Processing {directory}...")
+    stats = {'checked': 0, 'by_id': 0, 'no_reference': 0, 'unmatched': 0, 'skipped': 0}
+    files_changed = 0
+    names_changed = 0
+
+    taken = tree_ids(directory, spec['id_len'])
+    paths = scan(directory, level)
+    if manifest is not None:
+        paths = skip_unchanged(paths, manifest, stats)
+    changes_stream = match(parse(paths, manifest), reference, spec['id_len'], threshold, stats, cache,
+                           taken)
+    for path, changes in changes_stream:
+        if plan is not None:
+            for region_id, (old_name, new_name) in changes.items():
+                write_change(plan, path, region_id, old_name, new_name)
+            files_changed += 1
+            names_changed += len(changes)
+            if manifest is not None:
+                # Not applied yet, keep it pending for the next run
+                forget_file(manifest, path)
+        else:
+            applied, _ = apply_file_changes(path, changes)
+            if applied:
+                files_changed += 1
+                names_changed += applied
+            if manifest is not None:
+                record_file(manifest, path)
+
+    if manifest is not None:
+        print(f"Skipped {stats['skipped']} unchanged files in {directory}.")
+    print(f"Checked {stats['checked']} names in {directory}: {stats['by_id']} by id, "
+          f"{stats['unmatched']} unmatched, {stats['no_reference']} without reference.")
+    if plan is not None:
+        print(f"Planned {names_changed} updates in {files_changed} files in {directory}.")
+    else:
+        print(f"Updated {names_changed} names in {files_changed} files in {directory}.")
+
+def fix_tree(args, run):
+    levels = LEVEL_NAMES if args.level == 'all' else [args.level]
+
+    manifest = load_manifest(MANIFEST_PATH, settings_hash(args.reference, threshold=args.threshold))
+    if args.full:
+        manifest['files'] = {}
+
+    plan = open_plan(args.plan) if args.plan else None
+    try:
+        for level in levels:
+            with run.stage(f"load_reference:{level}"):
+                reference = load_reference(args.reference, (LEVELS[level]['id_len'],))
+            print(f"Loaded {sum(len(v) for v in reference.values())} {level} names from reference.")
+            cache = None if args.no_cache else MatchCache(level, settings_hash(args.reference))
+            try:
+                with run.stage(level):
+                    reconcile_level(level, reference, args.threshold, plan, manifest, cache)
+            finally:
+                if cache is not None:
+                    cache.close()
+                    print(cache.summary())
+            del reference
+    finally:
+        save_manifest(manifest)
+        if plan is not None:
+            plan.close()
+            print(f"Plan written to {args.plan}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fix kecamatan/kelurahan names against a reference list.")
+    parser.add_argument('--level', choices=LEVEL_NAMES + ['all'], default='all')
+    parser.add_argument('--reference', default=REFERENCE_PATH,
+                        help=f"CSV of kode wilayah, nama (default: {REFERENCE_PATH})")
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--plan', metavar='PATH',
+                        help="write the changes to a JSONL plan instead of rewriting files "
+                             "(apply it later with change_plan.py)")
+    parser.add_argument('--full', action='store_true',
+                        help=f"process every file, ignoring the {MANIFEST_PATH} of the last run")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not use or fill the persistent match cache")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.reference):
+        print("CSV Reference not found!")
+        print(f"{args.reference} is not in the repository: save the Kemendagri kode wilayah list "
+              f"there as 'kode, nama' rows (see the top of fix_levels.py) or pass --reference.")
+        return
+
+    with RunReport.from_args('fix_levels', args) as run:
+        fix_tree(args, run)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,30 @@
+import argparse
 import csv
 import json
 import os
 import difflib
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+from change_plan import open_plan, write_change
+from instrumentation import COUNTERS, RunReport, add_arguments, merge_counters, take_counters
+from tree_io import read_files, scan
+from wilayah import classify_file, parse_json, read_json
+from manifest import (file_unchanged, forget_file, hash_bytes, load_manifest, record_file,
+                      save_manifest, settings_hash)
+from match_cache import MISS, MatchCache, candidates_hash
 
 CSV_PATH = 'referensi/master_prov_kabupaten_kota.csv'
 DIR_KABUPATEN = 'kabupaten'
 DIR_KOTA = 'kota'
 PROVINSI_FILE = 'propinsi.json'
 PROVINSI_FILE_2 = 'provinsi.json'
+MANIFEST_PATH = '.fix_names_manifest.json'
+MATCH_THRESHOLD = 0.8
+
+# Full SequenceMatcher comparisons done by this process (for benchmark.py);
+# the same counters instrumentation.py reports
+MATCH_STATS = COUNTERS
 
 def load_csv_reference(csv_path):
     provinces = set()
@@ -33,6 +49,7 @@ def load_csv_reference(csv_path):
 
 def normalize_name(name):
     # Remove KAB., KOTA, prefixes
+    COUNTERS['normalize_calls'] += 1
     name = name.upper()
     name = re.sub(r'^(KABUPATEN|KAB\.?|KOTA|WIL\.|WILAYAH)\s*', '', name)
     name = re.sub(r'^(KEP\.?|KEPULAUAN)\s*', 'KEPULAUAN ', name) # Standardize Kepulauan
@@ -41,20 +58,106 @@ def normalize_name(name):
 
 def normalize_csv_name(name):
     # Remove Kabupaten, Kota prefixes for matching logic
+    COUNTERS['normalize_calls'] += 1
     name_upper = name.upper()
     name_upper = re.sub(r'^(KABUPATEN|KOTA|WIL\.\s*KOTA)\s*', '', name_upper)
     name_upper = re.sub(r'\s+', ' ', name_upper).strip()
     return name_upper
 
-def find_best_match(name, candidates, threshold=0.8):
+NGRAM_SIZE = 2
+
+def ngrams(text, n=NGRAM_SIZE):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+def build_match_index(candidates, normalize=None):
+    # Prebuilt lookup over the CSV candidates so find_best_match does not have
+    # to re-normalize and fuzzy-compare every candidate for every file.
+    #   exact:   normalized name -> position of the first candidate with it
+    #   grams:   character n-gram -> positions of candidates containing it
+    #   keys:    normalized name per position
+    #   matchers: SequenceMatcher per position with the candidate as seq2, so
+    #            difflib only builds its lookup tables once per candidate
+    #   hash:    identifies the candidate set for the match cache
+    #   cache:   optional MatchCache consulted by find_indexed_match
+    # normalize defaults to normalize_csv_name (CSV kab/kota names).
+    if normalize is None:
+        normalize = normalize_csv_name
+
+    index = {
+        'candidates': list(candidates),
+        'keys': [],
+        'exact': {},
+        'grams': {},
+        'matchers': [],
+        'by_length': [],
+        'hash': candidates_hash(candidates, normalize),
+        'cache': None,
+    }
+    for pos, candidate in enumerate(index['candidates']):
+        norm_cand = normalize(candidate)
+        index['keys'].append(norm_cand)
+        index['exact'].setdefault(norm_cand, pos)
+        for gram in ngrams(norm_cand):
+            index['grams'].setdefault(gram, []).append(pos)
+        matcher = difflib.SequenceMatcher(None)
+        matcher.set_seq2(norm_cand)
+        index['matchers'].append(matcher)
+        index['by_length'].append((len(norm_cand), pos))
+    index['by_length'].sort()
+    return index
+
+def _unbounded_total(threshold):
+    # Largest combined length of name and candidate at which a candidate can
+    # reach threshold without sharing a bigram with the name.
+    # SequenceMatcher's ratio is 2.0 * M / T for M matched characters and
+    # combined length T. Matched blocks of one character each need a gap
+    # between them, so T >= 3 * M - 1; a pair with 3 * M - T - 1 >= 1 has a
+    # block of two or more, i.e. a shared bigram. Checked with the smallest
+    # M that passes for each T, in integers, so float rounding of the bound
+    # cannot drop a length.
+    if threshold not in _UNBOUNDED_TOTALS:
+        worst = 0
+        for total in range(1, int(2 / (3 * threshold - 2)) + 8):
+            matched = next(m for m in range(total + 2) if m > total or 2.0 * m / total >= threshold)
+            if 3 * matched - total - 1 < 1:
+                worst = total
+        _UNBOUNDED_TOTALS[threshold] = worst
+    return _UNBOUNDED_TOTALS[threshold]
+
+_UNBOUNDED_TOTALS = {}
+
+def _index_shortlist(norm_name, index, threshold):
+    # Candidates that can possibly reach the threshold.
+    # Above a ratio of 2/3, any candidate that can pass shares a bigram with
+    # the name once the two are long enough (see _unbounded_total). Below
+    # that there is no such guarantee and every candidate is checked.
+    if NGRAM_SIZE == 2 and threshold > 2 / 3:
+        max_total = _unbounded_total(threshold)
+        grams = index['grams']
+        shortlist = set()
+        for gram in ngrams(norm_name):
+            shortlist.update(grams.get(gram, ()))
+        # Candidates short enough that the bound does not hold yet
+        for length, pos in index['by_length']:
+            if len(norm_name) + length > max_total:
+                break
+            shortlist.add(pos)
+        return sorted(shortlist)
+    return range(len(index['candidates']))
+
+def find_best_match(name, candidates, threshold=0.8, index=None):
     # name: the raw name from JSON (e.g. "KAB. ACEH SELATAN")
     # candidates: list of full names from CSV (e.g. "Kabupaten Aceh Selatan")
+    # index: optional build_match_index(candidates), same result but much faster
     
     # We normalized both to compare core names
     norm_name = normalize_name(name)
     
     # specific override for some abbreviations if needed
     
+    if index is not None:
+        return find_indexed_match(norm_name, index, threshold)
+
     best_ratio = 0
     best_match = None
     
@@ -66,6 +169,7 @@ def find_best_match(name, candidates, threshold=0.8):
             return candidate
             
         ratio = difflib.SequenceMatcher(None, norm_name, norm_cand).ratio()
+        MATCH_STATS['comparisons'] += 1
         if ratio > best_ratio:
             best_ratio = ratio
             best_match = candidate
@@ -75,6 +179,47 @@ def find_best_match(name, candidates, threshold=0.8):
     
     return None
 
+def find_indexed_match(norm_name, index, threshold=0.8):
+    # norm_name must already be normalized the way the index keys are
+    cache = index['cache']
+    if cache is None:
+        return _find_indexed_match(norm_name, index, threshold)
+    match = cache.get(index['hash'], threshold, norm_name)
+    if match is MISS:
+        match = _find_indexed_match(norm_name, index, threshold)
+        cache.put(index['hash'], threshold, norm_name, match)
+    return match
+
+def _find_indexed_match(norm_name, index, threshold):
+    # Exact core match
+    pos = index['exact'].get(norm_name)
+    if pos is not None:
+        return index['candidates'][pos]
+
+    # Walk the shortlist in candidate order and keep the first best ratio,
+    # which is the same tie-breaking as the linear scan.
+    best_ratio = 0
+    best_pos = None
+    matchers = index['matchers']
+    for pos in _index_shortlist(norm_name, index, threshold):
+        matcher = matchers[pos]
+        matcher.set_seq1(norm_name)
+        # Cheap upper bounds first; they can only rule a candidate out
+        if matcher.real_quick_ratio() <= best_ratio:
+            continue
+        if matcher.quick_ratio() <= best_ratio:
+            continue
+        ratio = matcher.ratio()
+        MATCH_STATS['comparisons'] += 1
+        if ratio > best_ratio:
+            best_ratio = ratio
+            best_pos = pos
+
+    if best_pos is not None and best_ratio >= threshold:
+        return index['candidates'][best_pos]
+
+    return None
+
 def is_kota(id_code):
     # Returns True if ID indicates Kota (xx71 .. xx99)
     # Returns False if Kabupaten (xx01 .. xx69)
@@ -87,87 +232,202 @@ def is_kota(id_code):
     except ValueError:
         return False
 
-def process_file_list(directory, csv_kabkota):
-    if not os.path.exists(directory):
-        print(f"Directory {directory} does not exist.")
-        return
+def build_kabkota_indexes(csv_kabkota, cache=None):
+    # Match indexes for the two candidate pools, keyed by is_kota(id)
+    # cache: optional MatchCache for both
+    kota_candidates = [c for c in csv_kabkota if "Kota " in c or "Wil. Kota" in c]
+    kab_candidates = [c for c in csv_kabkota if "Kabupaten " in c]
 
-    files = [f for f in os.listdir(directory) if f.endswith('.json')]
-    print(f"Processing {len(files)} files in {directory}...")
-    
-    updates_count = 0
-    
-    for filename in files:
-        path = os.path.join(directory, filename)
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        except Exception as e:
-            print(f"[{filename}] Error reading: {e}")
-            continue
-            
-        if isinstance(data, list):
-             # Skip list files (likely index files or lists of sub-districts)
-             # print(f"[{filename}] Skipped (is list)")
-             continue
-        
-        if not isinstance(data, dict):
-            continue
+    # Fallback (e.g. if CSV is unexpected)
+    indexes = {
+        True: build_match_index(kota_candidates or csv_kabkota),
+        False: build_match_index(kab_candidates or csv_kabkota),
+    }
+    for index in indexes.values():
+        index['cache'] = cache
+    return indexes
 
-        original_name = data.get('nama', '')
-        file_id = data.get('id', '')
-        
-        if not original_name:
-            continue
-            
-        # Determine strict candidate filtering based on ID
-        is_city = is_kota(file_id)
-        
-        filtered_candidates = []
-        if is_city:
-            # Must contain Kota
-            filtered_candidates = [c for c in csv_kabkota if "Kota " in c or "Wil. Kota" in c]
-            expected_type = "KOTA"
+def open_match_cache():
+    # MatchCache for kab/kota names, reset whenever the CSV changes
+    return MatchCache('kabkota', settings_hash(CSV_PATH))
+
+def group_by_content(paths):
+    # [(paths with byte-identical content, their bytes)], in first-seen order.
+    # export.php writes the same content to kota/ and kabupaten/ (and to
+    # provinsi.json and propinsi.json); each group only needs matching once.
+    # The bytes are handed on so the file is not read again for parsing or
+    # for the manifest; they are None for an unreadable file, which is
+    # reported by whoever reads it next.
+    groups = {}
+    for path, raw in read_files(paths, return_exceptions=True):
+        if isinstance(raw, Exception):
+            groups[path] = ([path], None)
         else:
-            # Must contain Kabupaten
-            filtered_candidates = [c for c in csv_kabkota if "Kabupaten " in c]
-            expected_type = "KABUPATEN"
-            
-        if not filtered_candidates:
-            # Fallback (e.g. if CSV is unexpected)
-            filtered_candidates = csv_kabkota
+            groups.setdefault(hash_bytes(raw), ([], raw))[0].append(path)
+    return list(groups.values())
+
+def process_file(directory, filename, indexes, dry_run=False, mirrors=(), raw=None):
+    # Match and rewrite a single file.
+    # Returns (change, messages, ok) so parallel runs can print in listing
+    # order; change is (id, old name, new name) or None, ok is False when the
+    # file could not be read. With dry_run the file is left untouched and
+    # only the change is reported. mirrors: other paths with the same
+    # content, rewritten with the same result. raw: the file's bytes when
+    # the caller already read them.
+    messages = []
+    path = os.path.join(directory, filename)
+    try:
+        # Skip list files (likely index files or lists of sub-districts)
+        # before parsing them; only single records are fixed here
+        if classify_file(directory, filename) == 'list':
+            return None, messages, True
+        data = parse_json(raw) if raw is not None else read_json(path)
+    except Exception as e:
+        messages.append(f"[{filename}] Error reading: {e}")
+        return None, messages, False
+        
+    if isinstance(data, list):
+         # Skip list files (likely index files or lists of sub-districts)
+         # print(f"[{filename}] Skipped (is list)")
+         return None, messages, True
+    
+    if not isinstance(data, dict):
+        return None, messages, True
 
-        match = find_best_match(original_name, filtered_candidates)
+    original_name = data.get('nama', '')
+    file_id = data.get('id', '')
+    
+    if not original_name:
+        return None, messages, True
         
-        if file_id == "3371":
-            print(f"DEBUG 3371: Is Kota: {is_city}. Orig: {original_name}. Candidates len: {len(filtered_candidates)}")
-            if filtered_candidates:
-                print(f"DEBUG 3371 Cand[0]: {filtered_candidates[0]}")
-            m = find_best_match(original_name, filtered_candidates)
-            print(f"DEBUG 3371 Match: {m}")
-
-        if match:
-             if original_name != match:
-                # print(f"[{filename}] {original_name} -> {match}")
+    # Determine strict candidate filtering based on ID
+    is_city = is_kota(file_id)
+    
+    index = indexes[is_city]
+    match = find_best_match(original_name, index['candidates'], MATCH_THRESHOLD, index=index)
+
+    if match:
+         if original_name != match:
+            # print(f"[{filename}] {original_name} -> {match}")
+            if not dry_run:
                 data['nama'] = match
-                with open(path, 'w', encoding='utf-8') as f:
-                     json.dump(data, f) # Compact dump
+                for target in [path, *mirrors]:
+                    with open(target, 'w', encoding='utf-8') as f:
+                         json.dump(data, f) # Compact dump
+                         COUNTERS['bytes_written'] += f.tell()
+                    COUNTERS['files_written'] += 1
+            return (file_id, original_name, match), messages, True
+
+    return None, messages, True
+
+# Per-process indexes for --workers, built once by the pool initializer
+_worker_indexes = None
+
+def _init_worker(csv_kabkota, use_cache=False):
+    global _worker_indexes
+    cache = open_match_cache() if use_cache else None
+    _worker_indexes = build_kabkota_indexes(csv_kabkota, cache)
+
+def _process_chunk(items, dry_run):
+    # items: (directory, filename, mirror paths, bytes or None)
+    # Returns (results, counters of this worker since its last chunk)
+    results = [process_file(directory, filename, _worker_indexes, dry_run, mirrors, raw)
+               for directory, filename, mirrors, raw in items]
+    cache = _worker_indexes[True]['cache']
+    if cache is not None:
+        cache.flush()
+    return results, take_counters()
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def process_file_list(directory, csv_kabkota, indexes=None, workers=1, plan=None, manifest=None,
+                      mirrors=()):
+    # plan: open change plan; changes are streamed to it instead of written
+    # manifest: load_manifest(...) result; files unchanged since the last run are skipped
+    # mirrors: directories holding copies of directory (kota/ for kabupaten/);
+    # identical files are matched once and the result written to every copy
+    if not os.path.exists(directory):
+        print(f"Directory {directory} does not exist.")
+        return
+
+    directories = [directory] + [m for m in mirrors if os.path.exists(m)]
+    paths = [entry.path for d in directories for entry in scan(d, ordered=False)
+             if entry.name.endswith('.json')]
+    print(f"Processing {len(paths)} files in {', '.join(directories)}...")
+
+    if manifest is not None:
+        pending = [p for p in paths if not file_unchanged(manifest, p)]
+        print(f"Skipped {len(paths) - len(pending)} unchanged files in {', '.join(directories)}.")
+        paths = pending
+
+    groups = group_by_content(paths)
+    if len(groups) < len(paths):
+        print(f"Matching {len(groups)} distinct files, {len(paths) - len(groups)} are mirrors.")
+    # (directory, filename, mirror paths, bytes) per distinct file
+    items = [(os.path.dirname(group[0]), os.path.basename(group[0]), group[1:], raw)
+             for group, raw in groups]
+
+    updates_count = 0
+    dry_run = plan is not None
+
+    def handle(item, change, messages, ok):
+        nonlocal updates_count
+        item_dir, filename, item_mirrors, raw = item
+        for message in messages:
+            print(message)
+        # A rewritten file has new content; an untouched one still has raw
+        content = None if change else raw
+        for path in [os.path.join(item_dir, filename), *item_mirrors]:
+            if change:
+                if plan is not None:
+                    write_change(plan, path, *change)
                 updates_count += 1
-        else:
-             pass
-             # print(f"[{filename}] No match for '{original_name}' (Expect {expected_type})")
+            if manifest is not None:
+                # Planned changes are not applied yet, so those files stay pending
+                if ok and not (change and dry_run):
+                    record_file(manifest, path, content)
+                else:
+                    forget_file(manifest, path)
 
-    print(f"Updated {updates_count} files in {directory}.")
+    if workers > 1 and items:
+        # A few chunks per worker keeps the pool busy without pickling
+        # one task per file. Results come back in chunk order, so the
+        # output is the same as a serial run.
+        chunk_size = max(1, -(-len(items) // (workers * 4)))
+        # Workers open the match cache themselves when the caller uses one
+        use_cache = indexes is not None and indexes[True]['cache'] is not None
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(csv_kabkota, use_cache)) as pool:
+            chunks = chunked(items, chunk_size)
+            futures = [pool.submit(_process_chunk, chunk, dry_run) for chunk in chunks]
+            for chunk, future in zip(chunks, futures):
+                results, counters = future.result()
+                merge_counters(counters)
+                for item, result in zip(chunk, results):
+                    handle(item, *result)
+    else:
+        if indexes is None:
+            indexes = build_kabkota_indexes(csv_kabkota)
 
-def process_provinces(csv_provinces):
-    # Process propinsi.json and provinsi.json
-    for pfile in [PROVINSI_FILE, PROVINSI_FILE_2]:
-        if not os.path.exists(pfile):
-            continue
-            
-        print(f"Processing {pfile}...")
-        with open(pfile, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        for item in items:
+            item_dir, filename, item_mirrors, raw = item
+            handle(item, *process_file(item_dir, filename, indexes, dry_run, item_mirrors, raw))
+
+    if dry_run:
+        print(f"Planned {updates_count} updates in {', '.join(directories)}.")
+    else:
+        print(f"Updated {updates_count} files in {', '.join(directories)}.")
+
+def process_provinces(csv_provinces, plan=None):
+    # Process propinsi.json and provinsi.json; identical copies are matched
+    # once and written together
+    # plan: open change plan; changes are streamed to it instead of written
+    existing = [pfile for pfile in [PROVINSI_FILE, PROVINSI_FILE_2] if os.path.exists(pfile)]
+    for group, raw in group_by_content(existing):
+        pfile = group[0]
+        print(f"Processing {', '.join(group)}...")
+        data = parse_json(raw) if raw is not None else read_json(pfile)
             
         updated = False
         for entry in data:
@@ -185,6 +445,7 @@ def process_provinces(csv_provinces):
             
             for cp in csv_provinces:
                 score = difflib.SequenceMatcher(None, name.lower(), cp.lower()).ratio()
+                MATCH_STATS['comparisons'] += 1
                 if score > best_score:
                     best_score = score
                     best_p = cp
@@ -192,27 +453,74 @@ def process_provinces(csv_provinces):
             if best_score > 0.95: # Very strict (fixes 'Papua Barat Daya' -> 'Papua Barat' issue)
                  if name != best_p:
                      print(f"Province Update: '{name}' -> '{best_p}'")
-                     entry['nama'] = best_p
-                     updated = True
+                     if plan is not None:
+                         for target in group:
+                             write_change(plan, target, entry.get('id'), name, best_p)
+                     else:
+                         entry['nama'] = best_p
+                         updated = True
             else:
                 print(f"Province No Match: '{name}'")
                 
         if updated:
-            with open(pfile, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2) # propinsi.json is multiline
+            for target in group:
+                with open(target, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2) # propinsi.json is multiline
+                    COUNTERS['bytes_written'] += f.tell()
+                COUNTERS['files_written'] += 1
+
+def fix_tree(args, run):
+    with run.stage('load_csv'):
+        ref_provinces, ref_kabkota = load_csv_reference(CSV_PATH)
+    
+    print(f"Loaded {len(ref_provinces)} provinces and {len(ref_kabkota)} kab/kota from CSV.")
+    
+    manifest = load_manifest(MANIFEST_PATH, settings_hash(CSV_PATH, threshold=MATCH_THRESHOLD))
+    if args.full:
+        manifest['files'] = {}
+
+    plan = open_plan(args.plan) if args.plan else None
+    cache = None if args.no_cache else open_match_cache()
+    try:
+        with run.stage('provinces'):
+            process_provinces(ref_provinces, plan)
+        with run.stage('build_indexes'):
+            indexes = build_kabkota_indexes(ref_kabkota, cache)
+        # kota/ mirrors kabupaten/; both are covered by one pass
+        with run.stage(DIR_KABUPATEN):
+            process_file_list(DIR_KABUPATEN, ref_kabkota, indexes, workers=args.workers,
+                              plan=plan, manifest=manifest, mirrors=[DIR_KOTA])
+    finally:
+        save_manifest(manifest)
+        if cache is not None:
+            cache.close()
+            # With --workers the lookups happen in the worker processes
+            if cache.stats['hits'] or cache.stats['misses']:
+                print(cache.summary())
+        if plan is not None:
+            plan.close()
+            print(f"Plan written to {args.plan}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Fix kabupaten/kota names against the CSV reference.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="process files in N worker processes (default: 1, serial)")
+    parser.add_argument('--plan', metavar='PATH',
+                        help="write the changes to a JSONL plan instead of rewriting files "
+                             "(apply it later with change_plan.py)")
+    parser.add_argument('--full', action='store_true',
+                        help=f"process every file, ignoring the {MANIFEST_PATH} of the last run")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not use or fill the persistent match cache")
+    add_arguments(parser)
+    args = parser.parse_args()
+
     if not os.path.exists(CSV_PATH):
         print("CSV Reference not found!")
         return
-        
-    ref_provinces, ref_kabkota = load_csv_reference(CSV_PATH)
-    
-    print(f"Loaded {len(ref_provinces)} provinces and {len(ref_kabkota)} kab/kota from CSV.")
-    
-    process_provinces(ref_provinces)
-    process_file_list(DIR_KABUPATEN, ref_kabkota)
-    process_file_list(DIR_KOTA, ref_kabkota)
+
+    with RunReport.from_args('fix_names', args) as run:
+        fix_tree(args, run)
 
 if __name__ == "__main__":
     main()
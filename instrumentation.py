@@ -0,0 +1,136 @@
+import cProfile
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+# Stage timers and counters for the fixer scripts, so a full-tree run can say
+# where its time goes. Counters are process-wide and cheap enough for the hot
+# paths (a dict increment):
+#   files_read, bytes_read, parse_seconds  read_json / parse_json (wilayah.py)
+#   files_written, bytes_written           the fixers' writes and write_atomic
+#   normalize_calls                        the name normalizers
+#   comparisons                            full SequenceMatcher.ratio() calls
+# Worker processes hand theirs back with take_counters() and the main process
+# adds them with merge_counters(). RunReport times named stages, keeps the
+# counter deltas of each, and writes everything as one JSON document. It can
+# also run cProfile and tracemalloc, both for the main process only.
+COUNTERS = Counter()
+
+# count() takes this, for counters bumped from tree_io.py's I/O threads
+COUNTERS_LOCK = threading.Lock()
+
+# Allocation sites listed in the report with --trace-memory
+TOP_ALLOCATIONS = 10
+
+def count(**amounts):
+    # Adds to several counters at once, safely from any thread
+    with COUNTERS_LOCK:
+        for name, amount in amounts.items():
+            COUNTERS[name] += amount
+
+def take_counters():
+    # The counters so far, reset to zero (for worker processes)
+    counters = dict(COUNTERS)
+    COUNTERS.clear()
+    return counters
+
+def merge_counters(counters):
+    COUNTERS.update(counters)
+
+def _delta(before):
+    return {name: value - before.get(name, 0) for name, value in COUNTERS.items()
+            if value != before.get(name, 0)}
+
+def _rounded(counters):
+    return {name: round(value, 6) if isinstance(value, float) else value
+            for name, value in sorted(counters.items())}
+
+class RunReport:
+    def __init__(self, script, path=None, profile_path=None, trace_memory=False):
+        # path: JSON run report; profile_path: cProfile stats (pstats format)
+        self.script = script
+        self.path = path
+        self.profile_path = profile_path
+        self.trace_memory = trace_memory
+        self.stages = []
+        self._profiler = None
+        self._started = None
+        self._start = None
+
+    @classmethod
+    def from_args(cls, script, args):
+        return cls(script, args.report, args.profile, args.trace_memory)
+
+    def __enter__(self):
+        self._started = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        self._start = time.perf_counter()
+        COUNTERS.clear()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.profile_path:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+        report = self.report()
+        if self.trace_memory:
+            tracemalloc.stop()
+        print("Stages: " + ', '.join(f"{s['stage']} {s['seconds']:.2f}s" for s in self.stages))
+        if self.path:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            print(f"Run report written to {self.path}")
+        return False
+
+    @contextmanager
+    def stage(self, name):
+        before = dict(COUNTERS)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append({'stage': name, 'seconds': round(time.perf_counter() - start, 6),
+                                'counters': _rounded(_delta(before))})
+
+    def report(self):
+        report = {
+            'script': self.script,
+            'argv': sys.argv[1:],
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'started': self._started,
+            'wall_seconds': round(time.perf_counter() - self._start, 6),
+            'stages': self.stages,
+            'counters': _rounded(COUNTERS),
+        }
+        if self.trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+            report['memory'] = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [{'where': str(stat.traceback), 'bytes': stat.size, 'blocks': stat.count}
+                        for stat in top],
+            }
+        if self.profile_path:
+            report['profile'] = self.profile_path
+        return report
+
+def add_arguments(parser):
+    # --report/--profile/--trace-memory for a script's argparse parser
+    parser.add_argument('--report', metavar='PATH',
+                        help="write a JSON run report with stage timings and counters")
+    parser.add_argument('--profile', metavar='PATH',
+                        help="run under cProfile and dump the stats to PATH (main process only)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="track allocations with tracemalloc and add them to the report")
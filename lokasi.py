@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from change_plan import dumps_like, write_text_atomic
+from tree_io import FileWriter, read_files
+from wilayah import PROPINSI_FILE, PROVINSI_FILE, parent_id
+from wilayah_db import DB_PATH, SOURCE_DIRS, TABLE_BY_ID_LEN, TABLES, iter_rows
+
+# Backfill of missing coordinates (latitude and longitude both 0) from the BMKG
+# prakiraan-cuaca endpoint, the Python version of lokasi.php.
+# A response for one region (?adm2=11.01) carries its own location and, in
+# "data", the locations of its children, so levels are done top-down: a region
+# is requested when it or one of its children is missing, and children the
+# parent's response filled need no request of their own.
+#
+# Requests run concurrently (aiohttp when installed, otherwise urllib in a
+# thread pool) with at most --concurrency in flight. The coordinates extracted
+# from every answered request are kept in a SQLite cache (not the forecasts,
+# which are most of the body), so an interrupted or repeated run only requests
+# what it has not seen. Filled coordinates are written in batches, either into
+# the JSON tree (list and record files, kota/ and propinsi.json mirrors) or
+# into wilayah.sqlite (wilayah_db.py).
+#
+# mock_bmkg.py serves recorded responses (--record) for testing:
+#   python mock_bmkg.py --responses recorded &
+#   python lokasi.py --api-url http://127.0.0.1:8001/publik/prakiraan-cuaca
+API_URL = 'https://api.bmkg.go.id/publik/prakiraan-cuaca'
+CACHE_PATH = '.lokasi_cache.sqlite'
+
+CONCURRENCY = 8
+TIMEOUT = 30
+RETRIES = 3
+BATCH_SIZE = 1000
+PROGRESS_EVERY = 500
+
+# Table -> adm depth of its ids in the API (adm1 = provinsi ... adm4 = kelurahan)
+DEPTH = {table: depth for depth, table in enumerate(TABLES, 1)}
+
+# Errors that mean no answer, worth a retry
+FETCH_ERRORS = (OSError, asyncio.TimeoutError) + ((aiohttp.ClientError,) if aiohttp is not None else ())
+
+# Answers worth remembering; anything else (5xx, 429, timeouts) is retried next run
+CACHED_STATUSES = (200, 404)
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    id TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    coordinates TEXT NOT NULL,
+    fetched REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+def adm_code(region_id):
+    # '1101012001' -> '11.01.01.2001'
+    parts = [region_id[:2], region_id[2:4], region_id[4:6], region_id[6:]]
+    return '.'.join(p for p in parts if p)
+
+def request_url(api_url, region_id):
+    depth = DEPTH[TABLE_BY_ID_LEN[len(region_id)]]
+    return f"{api_url}?{urllib.parse.urlencode({f'adm{depth}': adm_code(region_id)})}"
+
+def is_missing(point):
+    return point is None or (not point[0] and not point[1])
+
+def _point(lokasi):
+    try:
+        lat, lon = float(lokasi['lat']), float(lokasi['lon'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return None if is_missing((lat, lon)) else (lat, lon)
+
+def extract_coordinates(region_id, body):
+    # {id: (lat, lon)} for the requested region and the children listed in
+    # the response's "data"
+    found = {}
+    if not isinstance(body, dict):
+        return found
+    point = _point(body.get('lokasi') or {})
+    if point is not None:
+        found[region_id] = point
+    depth = DEPTH[TABLE_BY_ID_LEN[len(region_id)]]
+    if depth == len(TABLES):
+        return found
+    key = f"adm{depth + 1}"
+    for item in body.get('data') or []:
+        lokasi = item.get('lokasi') if isinstance(item, dict) else None
+        if not isinstance(lokasi, dict):
+            continue
+        child = re.sub(r'[^0-9]', '', str(lokasi.get(key, '')))
+        point = _point(lokasi)
+        if point is not None and child.startswith(region_id) and child != region_id:
+            found[child] = point
+    return found
+
+class ResponseCache:
+    # region id -> (status, {id: (lat, lon)}) of its answered request
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(CACHE_SCHEMA)
+        self._pending = []
+
+    def get(self, region_id):
+        row = self._conn.execute("SELECT status, coordinates FROM responses WHERE id = ?",
+                                 (region_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], {i: tuple(p) for i, p in json.loads(row[1]).items()}
+
+    def put(self, region_id, status, coordinates):
+        self._pending.append((region_id, status, json.dumps(coordinates), time.time()))
+        if len(self._pending) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", self._pending)
+            self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+class Fetcher:
+    # GET with retries; returns (status, parsed body or None), status None
+    # when the request never got an answer
+    def __init__(self, api_url=API_URL, concurrency=CONCURRENCY, timeout=TIMEOUT, record_dir=None):
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.record_dir = record_dir
+        self._session = None
+        self._executor = None
+
+    async def __aenter__(self):
+        if aiohttp is not None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        else:
+            self._executor = ThreadPoolExecutor(self.concurrency)
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._session is not None:
+            await self._session.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    async def _get_once(self, url):
+        if self._session is not None:
+            async with self._session.get(url) as response:
+                return response.status, await response.read()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._urllib_get, url)
+
+    def _urllib_get(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    async def get(self, region_id):
+        url = request_url(self.api_url, region_id)
+        status = None
+        for attempt in range(RETRIES):
+            if attempt:
+                await asyncio.sleep(2 ** attempt)
+            try:
+                status, raw = await self._get_once(url)
+            except FETCH_ERRORS as e:
+                print(f"[{region_id}] {url}: {e}")
+                status = None
+                continue
+            if status == 200:
+                if self.record_dir:
+                    with open(os.path.join(self.record_dir, f"{adm_code(region_id)}.json"), 'wb') as f:
+                        f.write(raw)
+                try:
+                    return status, json.loads(raw)
+                except ValueError:
+                    print(f"[{region_id}] {url}: response is not JSON")
+                    return None, None
+            if status in CACHED_STATUSES:
+                return status, None
+            # 429 and 5xx: back off and try again
+        return status, None
+
+class JsonTreeStore:
+    # Coordinates in the published tree: every list and record file that
+    # holds a region is updated, mirrors included
+    def __init__(self, base_dir='.'):
+        self.base_dir = base_dir
+
+    def coordinates(self, table):
+        # A region is missing when any of its copies is, so a copy left
+        # behind (e.g. by an interrupted run) is filled by the next one
+        points = {}
+        for region_id, _, _, lat, lon in iter_rows(self.base_dir, table, with_records=True):
+            if region_id not in points or is_missing((lat, lon)):
+                points[region_id] = (lat, lon)
+        return points
+
+    def _files(self, table, region_id):
+        if table == 'provinsi':
+            return [PROVINSI_FILE, PROPINSI_FILE]
+        return [os.path.join(directory, f"{name}.json") for directory in SOURCE_DIRS[table]
+                for name in (parent_id(region_id), region_id)]
+
+    def write(self, table, points):
+        by_file = {}
+        for region_id, point in points.items():
+            for path in self._files(table, region_id):
+                by_file.setdefault(path, {})[region_id] = point
+        full_paths = {os.path.join(self.base_dir, path): file_points
+                      for path, file_points in sorted(by_file.items())}
+        existing = [path for path in full_paths if os.path.exists(path)]
+        # Files are read and rewritten from thread pools (tree_io.py)
+        with FileWriter(write=write_text_atomic) as writer:
+            for full_path, raw in read_files(existing):
+                original_text = raw.decode('utf-8')
+                data = json.loads(original_text)
+                changed = False
+                for entry in data if isinstance(data, list) else [data]:
+                    if not isinstance(entry, dict):
+                        continue
+                    point = full_paths[full_path].get(str(entry.get('id')))
+                    if point is None or not is_missing((entry.get('latitude'), entry.get('longitude'))):
+                        continue
+                    entry['latitude'], entry['longitude'] = point
+                    changed = True
+                if changed:
+                    writer.write(full_path, dumps_like(data, original_text))
+        return writer.written
+
+    def close(self):
+        pass
+
+class SqliteStore:
+    # Coordinates in the SQLite copy built by wilayah_db.py
+    def __init__(self, db_path=DB_PATH):
+        self._conn = sqlite3.connect(db_path)
+
+    def coordinates(self, table):
+        return {row[0]: (row[1], row[2])
+                for row in self._conn.execute(f"SELECT id, latitude, longitude FROM {table}")}
+
+    def write(self, table, points):
+        with self._conn:
+            self._conn.executemany(f"UPDATE {table} SET latitude = ?, longitude = ? WHERE id = ?",
+                                   [(lat, lon, region_id) for region_id, (lat, lon) in points.items()])
+        return len(points)
+
+    def close(self):
+        self._conn.close()
+
+class Backfill:
+    def __init__(self, store, fetcher, cache=None, tables=TABLES, refresh=False):
+        self.store = store
+        self.fetcher = fetcher
+        self.cache = cache
+        self.tables = [t for t in TABLES if t in tables]
+        self.refresh = refresh
+        self.points = {table: store.coordinates(table) for table in self.tables}
+        self.pending = {table: {} for table in self.tables}
+        self.stats = {'requests': 0, 'cached': 0, 'failed': 0, 'not_found': 0,
+                      **{f"filled_{table}": 0 for table in self.tables}}
+
+    def wanted(self, table):
+        # Ids of a table to request: missing themselves or parent of a missing child
+        points = self.points[table]
+        wanted = {region_id for region_id, point in points.items() if is_missing(point)}
+        child_index = TABLES.index(table) + 1
+        if child_index < len(TABLES) and TABLES[child_index] in self.points:
+            for region_id, point in self.points[TABLES[child_index]].items():
+                parent = parent_id(region_id)
+                if is_missing(point) and parent in points:
+                    wanted.add(parent)
+        return sorted(wanted)
+
+    def fill(self, coordinates):
+        for region_id, point in coordinates.items():
+            table = TABLE_BY_ID_LEN.get(len(region_id))
+            if table not in self.points:
+                continue
+            if region_id in self.points[table] and is_missing(self.points[table][region_id]):
+                self.points[table][region_id] = point
+                self.pending[table][region_id] = point
+                self.stats[f"filled_{table}"] += 1
+        if sum(len(p) for p in self.pending.values()) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        for table, points in self.pending.items():
+            if points:
+                self.store.write(table, points)
+                points.clear()
+
+    def record(self, region_id, status, body):
+        if status is None or status not in CACHED_STATUSES:
+            self.stats['failed'] += 1
+            return
+        if status == 404:
+            self.stats['not_found'] += 1
+        coordinates = extract_coordinates(region_id, body) if body is not None else {}
+        if self.cache is not None:
+            self.cache.put(region_id, status, {i: list(p) for i, p in coordinates.items()})
+        self.fill(coordinates)
+
+    async def run_table(self, table):
+        queue = asyncio.Queue()
+        for region_id in self.wanted(table):
+            cached = None if self.cache is None or self.refresh else self.cache.get(region_id)
+            if cached is not None:
+                self.stats['cached'] += 1
+                self.fill(cached[1])
+            else:
+                queue.put_nowait(region_id)
+        total = queue.qsize()
+        print(f"{table}: {total} requests")
+        start = time.perf_counter()
+        done = 0
+
+        async def worker():
+            nonlocal done
+            while True:
+                try:
+                    region_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                status, body = await self.fetcher.get(region_id)
+                self.stats['requests'] += 1
+                self.record(region_id, status, body)
+                done += 1
+                if done % PROGRESS_EVERY == 0:
+                    rate = done / (time.perf_counter() - start)
+                    print(f"{table}: {done}/{total} requests ({rate:.1f}/s)")
+
+        await asyncio.gather(*(worker() for _ in range(self.fetcher.concurrency)))
+        self.flush()
+
+    async def run(self):
+        try:
+            for table in self.tables:
+                await self.run_table(table)
+        finally:
+            # Whatever was fetched before an interruption is kept
+            self.flush()
+            if self.cache is not None:
+                self.cache.flush()
+        return self.stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill missing coordinates from the BMKG API.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--db', help="update this SQLite file (wilayah_db.py) instead of the JSON tree")
+    parser.add_argument('--level', choices=TABLES, action='append',
+                        help="only these levels (repeatable, default: all)")
+    parser.add_argument('--api-url', default=API_URL, help=f"endpoint (default: {API_URL})")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help=f"requests in flight (default: {CONCURRENCY})")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help="seconds per request")
+    parser.add_argument('--cache', default=CACHE_PATH, help=f"response cache (default: {CACHE_PATH})")
+    parser.add_argument('--no-cache', action='store_true', help="do not use or fill the response cache")
+    parser.add_argument('--refresh', action='store_true', help="request again what the cache already has")
+    parser.add_argument('--record', metavar='DIR',
+                        help="also save the raw responses in DIR, for mock_bmkg.py")
+    args = parser.parse_args()
+
+    store = SqliteStore(args.db) if args.db else JsonTreeStore(args.base_dir)
+    cache = None if args.no_cache else ResponseCache(os.path.join(args.base_dir, args.cache))
+    if aiohttp is None:
+        print("aiohttp is not installed, using urllib in threads.")
+
+    async def run():
+        async with Fetcher(args.api_url, args.concurrency, args.timeout, args.record) as fetcher:
+            return await Backfill(store, fetcher, cache, args.level or TABLES, args.refresh).run()
+
+    start = time.perf_counter()
+    try:
+        stats = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Interrupted; what was fetched so far is written and cached, run again to continue.")
+        return
+    finally:
+        if cache is not None:
+            cache.close()
+        store.close()
+    filled = ', '.join(f"{stats[f'filled_{t}']} {t}" for t in TABLES if f"filled_{t}" in stats)
+    print(f"{stats['requests']} requests ({stats['cached']} answered from cache, {stats['not_found']} "
+          f"not found, {stats['failed']} failed); filled {filled} in {time.perf_counter() - start:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+
+from change_plan import write_text_atomic
+
+# Content-hash manifest for incremental runs.
+# Stored next to the tree, it remembers for every processed file its size,
+# mtime and sha1, plus one hash over the reference data and matcher settings.
+# A file is skipped when its stat is unchanged, or when only the mtime moved
+# (e.g. after a checkout) and the content hash is still the same. Any change
+# to the reference or the settings invalidates the whole manifest.
+MANIFEST_VERSION = 1
+
+def hash_bytes(data):
+    return hashlib.sha1(data).hexdigest()
+
+def settings_hash(reference_path, **settings):
+    # reference_path may be None for runs that do not depend on one
+    h = hashlib.sha1()
+    h.update(str(MANIFEST_VERSION).encode())
+    if reference_path is not None:
+        with open(reference_path, 'rb') as f:
+            h.update(f.read())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()
+
+def load_manifest(path, settings):
+    # settings: settings_hash(...) of the current run
+    manifest = {'path': path, 'settings': settings, 'files': {}}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except Exception as e:
+            print(f"[{path}] Error reading manifest, starting fresh: {e}")
+            return manifest
+        if stored.get('settings') == settings:
+            # 'files' plus whatever else the script keeps in its manifest
+            manifest.update((k, v) for k, v in stored.items() if k != 'settings')
+        else:
+            print("Reference or settings changed, manifest reset.")
+    return manifest
+
+def file_unchanged(manifest, path):
+    entry = manifest['files'].get(path)
+    if entry is None:
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    size, mtime_ns, digest = entry
+    if st.st_size != size:
+        return False
+    if st.st_mtime_ns == mtime_ns:
+        return True
+    with open(path, 'rb') as f:
+        if hash_bytes(f.read()) != digest:
+            return False
+    entry[1] = st.st_mtime_ns
+    return True
+
+def file_entry(path, content=None):
+    # [size, mtime_ns, sha1] of a file; content: the bytes just read, to
+    # avoid reading the file again
+    st = os.stat(path)
+    if content is None:
+        with open(path, 'rb') as f:
+            content = f.read()
+    return [st.st_size, st.st_mtime_ns, hash_bytes(content)]
+
+def record_file(manifest, path, content=None):
+    manifest['files'][path] = file_entry(path, content)
+
+def forget_file(manifest, path):
+    manifest['files'].pop(path, None)
+
+def save_manifest(manifest):
+    stored = {k: v for k, v in manifest.items() if k != 'path'}
+    write_text_atomic(manifest['path'], json.dumps(stored, separators=(',', ':')))
@@ -0,0 +1,145 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+# Persistent cache of fuzzy match results, shared by the fixer scripts.
+# A result (the chosen reference name, or no match) is stored under
+#   (namespace, candidate set hash, threshold, normalized input name)
+# in a small SQLite file. The in-process front is an LRU of whole candidate
+# groups: the first lookup in a group (e.g. one kecamatan's kelurahan) loads
+# all its cached results with one query, since siblings are looked up
+# together. Each namespace (kabkota, kecamatan, kelurahan) remembers the hash
+# of the reference it was filled from; when the reference changes its entries
+# are dropped. The file is kept under max_entries rows by evicting the least
+# recently used groups.
+MATCH_CACHE_PATH = '.match_cache.sqlite'
+
+# Bump when normalization or matching changes, so old results are not reused
+CACHE_VERSION = 1
+
+MAX_ENTRIES = 500000
+MEMORY_GROUPS = 1024
+FLUSH_EVERY = 2000
+
+# get() result for names that are not cached (None is a cached "no match")
+MISS = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    namespace TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS matches (
+    namespace TEXT NOT NULL,
+    candidates TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    name TEXT NOT NULL,
+    result TEXT,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (namespace, candidates, threshold, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS matches_used ON matches (used);
+"""
+
+def candidates_hash(candidates, normalize=None):
+    # Identifies a candidate list and how it is normalized
+    h = hashlib.sha1()
+    h.update(f"{CACHE_VERSION}:{getattr(normalize, '__name__', '')}".encode())
+    for candidate in candidates:
+        h.update(b'\0')
+        h.update(candidate.encode('utf-8'))
+    return h.hexdigest()
+
+class MatchCache:
+    def __init__(self, namespace, reference_hash, path=MATCH_CACHE_PATH,
+                 max_entries=MAX_ENTRIES, memory_groups=MEMORY_GROUPS):
+        self.namespace = namespace
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_groups = memory_groups
+        self.stats = {'hits': 0, 'misses': 0}
+
+        # (candidates, threshold) -> {name: result}, complete for the group
+        self._groups = OrderedDict()
+        self._pending = []   # (candidates, threshold, name, result) not written yet
+        self._touched = set()  # groups used since the last flush
+
+        # Several worker processes may share the file
+        self._conn = sqlite3.connect(path, timeout=60)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._tick = self._conn.execute("SELECT COALESCE(MAX(used), 0) FROM matches").fetchone()[0]
+
+        row = self._conn.execute("SELECT hash FROM refs WHERE namespace = ?", (namespace,)).fetchone()
+        if row is None or row[0] != reference_hash:
+            with self._conn:
+                if row is not None:
+                    print(f"Reference for {namespace} changed, match cache cleared.")
+                self._conn.execute("DELETE FROM matches WHERE namespace = ?", (namespace,))
+                self._conn.execute("INSERT OR REPLACE INTO refs VALUES (?, ?)", (namespace, reference_hash))
+
+    def _group(self, candidates, threshold):
+        group_key = (candidates, threshold)
+        group = self._groups.get(group_key)
+        if group is None:
+            rows = self._conn.execute(
+                "SELECT name, result FROM matches WHERE namespace = ? AND candidates = ? AND threshold = ?",
+                (self.namespace, candidates, threshold))
+            group = self._groups[group_key] = dict(rows)
+            if len(self._groups) > self.memory_groups:
+                self._groups.popitem(last=False)
+        else:
+            self._groups.move_to_end(group_key)
+        self._touched.add(group_key)
+        return group
+
+    def get(self, candidates, threshold, name):
+        # Cached result for a normalized name, or MISS
+        group = self._group(candidates, threshold)
+        if name in group:
+            self.stats['hits'] += 1
+            return group[name]
+        self.stats['misses'] += 1
+        return MISS
+
+    def put(self, candidates, threshold, name, result):
+        self._group(candidates, threshold)[name] = result
+        self._pending.append((candidates, threshold, name, result))
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self._pending and not self._touched:
+            return
+        self._tick += 1
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?)",
+                [(self.namespace, *row, self._tick) for row in self._pending])
+            self._conn.executemany(
+                "UPDATE matches SET used = ? WHERE namespace = ? AND candidates = ? AND threshold = ?",
+                [(self._tick, self.namespace, *group_key) for group_key in self._touched])
+        self._pending.clear()
+        self._touched.clear()
+
+    def evict(self):
+        # Drop the least recently used rows above max_entries (all namespaces)
+        total = self._conn.execute("SELECT COUNT(*) FROM matches").fetchone()[0]
+        excess = total - self.max_entries
+        if excess > 0:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM matches WHERE (namespace, candidates, threshold, name) IN "
+                    "(SELECT namespace, candidates, threshold, name FROM matches ORDER BY used LIMIT ?)",
+                    (excess,))
+        return max(0, excess)
+
+    def close(self):
+        self.flush()
+        self.evict()
+        self._conn.close()
+
+    def summary(self):
+        total = self.stats['hits'] + self.stats['misses']
+        return f"Match cache ({self.namespace}): {self.stats['hits']}/{total} hits"
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from lokasi import adm_code
+from wilayah import parent_id
+from wilayah_db import TABLES, iter_rows
+
+# Local stand-in for the BMKG prakiraan-cuaca endpoint, for testing lokasi.py
+# without sending thousands of requests to BMKG. It answers ?adm1= ... ?adm4=
+# from either
+#   --responses DIR  responses recorded by lokasi.py --record (DIR/11.01.json)
+#   --tree DIR       responses built from the coordinates of a data tree, in
+#                    the same shape: "lokasi" of the region, "data" with the
+#                    "lokasi" of each child, no forecasts
+# and 404 for codes it does not know. --delay and --error-rate make it slow
+# and unreliable like the real thing.
+#
+#   python mock_bmkg.py --tree /path/to/complete/tree &
+#   python lokasi.py --api-url http://127.0.0.1:8001/publik/prakiraan-cuaca
+PORT = 8001
+
+def tree_responses(base_dir):
+    # {adm code: response body} for every region of a tree
+    rows = {}
+    children = {}
+    for table in TABLES:
+        for region_id, _, nama, lat, lon in iter_rows(base_dir, table):
+            rows.setdefault(region_id, (table, nama, lat, lon))
+            if table != 'provinsi':
+                children.setdefault(parent_id(region_id), []).append(region_id)
+
+    def lokasi(region_id):
+        table, nama, lat, lon = rows[region_id]
+        depth = TABLES.index(table) + 1
+        # Missing coordinates come back empty, as BMKG does for unknown places
+        return {f"adm{depth}": adm_code(region_id), 'nama': nama,
+                'lat': lat or None, 'lon': lon or None}
+
+    responses = {}
+    for region_id in rows:
+        data = [{'lokasi': lokasi(c), 'cuaca': []} for c in sorted(set(children.get(region_id, ())))]
+        if not data:
+            data = [{'lokasi': lokasi(region_id), 'cuaca': []}]
+        responses[adm_code(region_id)] = json.dumps({'lokasi': lokasi(region_id), 'data': data}).encode()
+    return responses
+
+class MockHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        code = next((query[f"adm{depth}"][0] for depth in range(4, 0, -1) if f"adm{depth}" in query), None)
+        if server.delay:
+            time.sleep(server.delay)
+        if random.random() < server.error_rate:
+            self.send_error(503)
+            return
+        body = server.lookup(code) if code else None
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def make_server(host='127.0.0.1', port=PORT, responses_dir=None, tree_dir=None,
+                delay=0.0, error_rate=0.0, verbose=False):
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.delay = delay
+    server.error_rate = error_rate
+    server.verbose = verbose
+    if tree_dir is not None:
+        responses = tree_responses(tree_dir)
+        server.lookup = responses.get
+    else:
+        def lookup(code):
+            path = os.path.join(responses_dir, f"{code}.json")
+            if os.sep in code or not os.path.isfile(path):
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        server.lookup = lookup
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded BMKG prakiraan-cuaca responses locally.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--responses', metavar='DIR', help="directory of responses saved by lokasi.py --record")
+    source.add_argument('--tree', metavar='DIR', help="build the responses from this data tree")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds before each answer")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.responses, args.tree, args.delay,
+                         args.error_rate, args.verbose)
+    print(f"Serving on http://{args.host}:{args.port}/publik/prakiraan-cuaca")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+from export import php_json_encode
+from tree_io import WORKERS, FileWriter, bounded_map
+from wilayah import LEVELS, PROPINSI_FILE, PROVINSI_FILE, parent_id, read_json
+from wilayah_db import SOURCE_DIRS, TABLES
+
+# The whole tree as one NDJSON stream, one region per line:
+#   {"level": "kecamatan", "id": "110101", "parent_id": "1101", "nama": "Bakongan",
+#    "latitude": 2.96, "longitude": 97.46}
+# Regions come in id order, which for these prefix ids is depth first: every
+# region is followed by its descendants before its next sibling. The exporter
+# walks provinsi.json and then the list file of each region on the way down,
+# so it holds one list per level (kabupaten/ and its kota/ mirror merged,
+# first copy of an id wins) plus a bounded number of kelurahan lists read
+# ahead. The importer keeps the open parents on a stack and writes a parent's
+# list file as soon as the stream moves past it, so it holds no more than one
+# list per level either. It writes export.php's layout: list and record files
+# in json_encode format, kota/ mirroring kabupaten/ and both provinsi.json and
+# propinsi.json. Reads and writes go through tree_io.py's bounded thread pools.
+# Streams are gzip compressed when the path ends in .gz (or with --gzip);
+# gzip input is recognized by its magic bytes. '-' is stdin/stdout.
+#
+#   python ndjson_stream.py export wilayah.ndjson.gz
+#   python ndjson_stream.py import wilayah.ndjson.gz --base-dir /tmp/tree
+GZIP_MAGIC = b'\x1f\x8b'
+GZIP_LEVEL = 6
+
+# Level of each depth and the levels that have a list file of children
+STREAM_LEVELS = TABLES
+PARENT_LEVELS = TABLES[:-1]
+
+def open_output(path, compress=None):
+    # Text stream for writing; compress defaults to path ending in .gz
+    if compress is None:
+        compress = path.endswith('.gz')
+    raw = sys.stdout.buffer if path == '-' else open(path, 'wb')
+    if compress:
+        raw = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=GZIP_LEVEL, mtime=0)
+    return io.TextIOWrapper(raw, encoding='utf-8', newline='\n')
+
+def open_input(path):
+    # Text stream for reading, gzip or plain
+    raw = io.BufferedReader(sys.stdin.buffer.raw) if path == '-' else open(path, 'rb')
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw, mode='rb')
+    return io.TextIOWrapper(raw, encoding='utf-8')
+
+def read_children(base_dir, level, region_id):
+    # (children of region_id from its list file(s) in id order, skipped).
+    # Entries whose id is not a child of region_id (e.g. old 7 digit
+    # kecamatan ids) are skipped and counted.
+    id_len = LEVELS[level]['id_len']
+    children = {}
+    skipped = 0
+    for directory in SOURCE_DIRS[level]:
+        path = os.path.join(base_dir, directory, f"{region_id}.json")
+        if not os.path.exists(path):
+            continue
+        data = read_json(path)
+        for entry in data if isinstance(data, list) else []:
+            if not isinstance(entry, dict) or 'id' not in entry:
+                continue
+            child_id = str(entry['id'])
+            if len(child_id) != id_len or parent_id(child_id) != region_id:
+                skipped += 1
+                continue
+            children.setdefault(child_id, entry)
+    return [children[child_id] for child_id in sorted(children)], skipped
+
+def _record(level, entry):
+    region_id = str(entry['id'])
+    return {'level': level, 'id': region_id, 'parent_id': parent_id(region_id),
+            'nama': entry.get('nama', ''),
+            'latitude': entry.get('latitude'), 'longitude': entry.get('longitude')}
+
+def iter_records(base_dir='.', stats=None, workers=WORKERS):
+    # Every region of the tree as a stream record, in id order. The levels
+    # above kelurahan are walked here; the kelurahan lists, most of the
+    # files, are read ahead from a thread pool as their kecamatan come up.
+    stats = stats if stats is not None else {'skipped': 0}
+    leaf_level = STREAM_LEVELS[-1]
+
+    def walk(depth, entries):
+        level = STREAM_LEVELS[depth]
+        for entry in entries:
+            record = _record(level, entry)
+            yield record
+            if level != PARENT_LEVELS[-1]:
+                children, skipped = read_children(base_dir, STREAM_LEVELS[depth + 1], record['id'])
+                stats['skipped'] += skipped
+                yield from walk(depth + 1, children)
+
+    def leaves(record):
+        if record['level'] != PARENT_LEVELS[-1]:
+            return [], 0
+        return read_children(base_dir, leaf_level, record['id'])
+
+    provinces = read_json(os.path.join(base_dir, PROVINSI_FILE))
+    provinces = sorted((p for p in provinces if isinstance(p, dict) and 'id' in p),
+                       key=lambda p: str(p['id']))
+    for record, (children, skipped) in bounded_map(leaves, walk(0, provinces), workers):
+        stats['skipped'] += skipped
+        yield record
+        for entry in children:
+            yield _record(leaf_level, entry)
+
+def export_stream(path, base_dir='.', compress=None, workers=WORKERS):
+    counts = dict.fromkeys(STREAM_LEVELS, 0)
+    stats = {'skipped': 0}
+    with open_output(path, compress) as out:
+        for record in iter_records(base_dir, stats, workers):
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            counts[record['level']] += 1
+    return counts, stats['skipped']
+
+def _entry(record):
+    return {'id': record['id'], 'nama': record['nama'],
+            'latitude': record['latitude'], 'longitude': record['longitude']}
+
+def import_stream(path, base_dir='.', workers=WORKERS):
+    # Rebuilds the tree under base_dir from a stream in id order
+    for level in ('kabupaten', 'kota', 'kecamatan', 'kelurahan'):
+        os.makedirs(os.path.join(base_dir, LEVELS[level]['dir']), exist_ok=True)
+    writer = FileWriter(workers)
+    provinces = []
+    stack = []  # (level, id, children) of the open parents, outermost first
+    counts = dict.fromkeys(STREAM_LEVELS, 0)
+
+    def close_parent():
+        level, region_id, children = stack.pop()
+        encoded = php_json_encode(children)
+        # kabupaten lists and records also go to the kota/ mirror
+        for directory in SOURCE_DIRS[STREAM_LEVELS[STREAM_LEVELS.index(level) + 1]]:
+            writer.write(os.path.join(base_dir, directory, f"{region_id}.json"), encoded)
+
+    try:
+        with open_input(path) as stream:
+            for line_number, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                level = record['level']
+                depth = STREAM_LEVELS.index(level)
+                while len(stack) > depth:
+                    close_parent()
+                expected = stack[-1][1] if stack else None
+                if len(stack) != depth or record['parent_id'] != expected or \
+                        (stack and stack[-1][2] and stack[-1][2][-1]['id'] >= record['id']):
+                    raise ValueError(f"{path}:{line_number}: {level} {record['id']} is out of id order")
+
+                entry = _entry(record)
+                if depth == 0:
+                    if provinces and provinces[-1]['id'] >= record['id']:
+                        raise ValueError(f"{path}:{line_number}: provinsi {record['id']} is out of id order")
+                    provinces.append(entry)
+                else:
+                    stack[-1][2].append(entry)
+                    encoded = php_json_encode(entry)
+                    for directory in SOURCE_DIRS[level]:
+                        writer.write(os.path.join(base_dir, directory, f"{record['id']}.json"), encoded)
+                if level in PARENT_LEVELS:
+                    stack.append((level, record['id'], []))
+                counts[level] += 1
+        while stack:
+            close_parent()
+        encoded = php_json_encode(provinces)
+        writer.write(os.path.join(base_dir, PROVINSI_FILE), encoded)
+        writer.write(os.path.join(base_dir, PROPINSI_FILE), encoded)
+    finally:
+        writer.close()
+    return counts, writer.written
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the tree to, or rebuild it from, one NDJSON stream.")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('path', help="NDJSON file, .gz for gzip, - for stdout/stdin")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--gzip', action='store_true', help="gzip the export even without a .gz name")
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f"I/O threads (default: {WORKERS})")
+    args = parser.parse_args()
+
+    # Summaries go to stderr so '-' can be piped
+    start = time.perf_counter()
+    if args.command == 'export':
+        counts, skipped = export_stream(args.path, args.base_dir, True if args.gzip else None,
+                                        args.workers)
+        summary = ', '.join(f"{count} {level}" for level, count in counts.items())
+        print(f"Exported {summary} to {args.path}.", file=sys.stderr)
+        if skipped:
+            print(f"Skipped {skipped} list entries that are not children of their file's region.",
+                  file=sys.stderr)
+    else:
+        counts, written = import_stream(args.path, args.base_dir, args.workers)
+        summary = ', '.join(f"{count} {level}" for level, count in counts.items())
+        print(f"Imported {summary}; wrote {written} files to {args.base_dir}.", file=sys.stderr)
+    print(f"Done in {time.perf_counter() - start:.1f}s.", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+from change_plan import write_atomic
+from region_registry import LEVEL_NAMES, RegionRegistry
+
+# The whole tree packed into one binary file that is opened with mmap.
+#
+#   magic        8 bytes  b'WILPACK1'
+#   header size  uint64
+#   header       JSON: byte order, coordinate type and, per level, the row
+#                count, the first global row and the offsets of its columns
+#                (from the first 8-byte boundary after the header)
+#   columns      8-byte aligned, little-endian, per level in id order:
+#                  ids        uint64
+#                  latitude   float64 (or float32 with --float32)
+#                  longitude  float64 (or float32)
+#   names        uint32 offsets (one per row of every level, plus one) into a
+#                UTF-8 blob; row i is blob[offsets[i]:offsets[i + 1]]
+#
+# PackedTree is a RegionRegistry whose columns are memoryviews cast straight
+# over the mapping, so opening costs a header read, lookups are binary
+# searches over the mapped ids, child ranges are slices of them, and only the
+# pages that are touched are ever read. Everything built on RegionRegistry
+# (bundle.py, spatial_index.py, autocomplete_server.py) works on it as is.
+PACK_PATH = 'wilayah.pack'
+MAGIC = b'WILPACK1'
+VERSION = 1
+ALIGNMENT = 8
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+def pack_registry(registry, coordinates='d'):
+    # The packed file's bytes for a RegionRegistry
+    header = {'version': VERSION, 'byteorder': 'little', 'coordinates': coordinates, 'levels': {}}
+    chunks = []
+    offset = 0
+
+    def add(data):
+        nonlocal offset
+        padding = _align(offset) - offset
+        chunks.append(b'\0' * padding)
+        offset += padding
+        start = offset
+        chunks.append(data)
+        offset += len(data)
+        return start
+
+    names = registry.name_table()
+    name_offsets = array('I', [0])
+    blob = bytearray()
+    base = 0
+    for level in LEVEL_NAMES:
+        columns = registry.columns(level)
+        count = len(columns['ids'])
+        header['levels'][level] = {
+            'count': count,
+            'base': base,
+            'ids': add(_little_endian(array('Q', columns['ids']))),
+            'latitude': add(_little_endian(array(coordinates, columns['latitude']))),
+            'longitude': add(_little_endian(array(coordinates, columns['longitude']))),
+        }
+        for name_id in columns['names']:
+            blob += names[name_id].encode('utf-8')
+            name_offsets.append(len(blob))
+        base += count
+    header['names'] = {'offsets': add(_little_endian(name_offsets)), 'blob': add(bytes(blob)),
+                       'size': len(blob)}
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode()
+    prefix = MAGIC + struct.pack('<Q', len(header_bytes)) + header_bytes
+    return prefix + b'\0' * (_align(len(prefix)) - len(prefix)) + b''.join(chunks)
+
+class _NameTable:
+    # Sequence of names decoded from the blob on access
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+class PackedTree(RegionRegistry):
+    def __init__(self, path=PACK_PATH):
+        # Maps the file read-only; nothing is copied or decoded up front
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            view.release()
+            self._mmap.close()
+            raise ValueError(f"{path} is not a packed tree")
+        header_size, = struct.unpack_from('<Q', view, len(MAGIC))
+        header = json.loads(bytes(view[len(MAGIC) + 8:len(MAGIC) + 8 + header_size]))
+        if header['version'] != VERSION or header['byteorder'] != sys.byteorder:
+            view.release()
+            self._mmap.close()
+            raise ValueError(f"{path}: unsupported version or byte order")
+        self.header = header
+        data_start = _align(len(MAGIC) + 8 + header_size)
+
+        self._views = [view]
+
+        def column(offset, typecode, count):
+            offset += data_start
+            size = array(typecode).itemsize
+            cast = view[offset:offset + count * size].cast(typecode)
+            self._views.append(cast)
+            return cast
+
+        coordinates = header['coordinates']
+        self._levels = {}
+        for level in LEVEL_NAMES:
+            spec = header['levels'][level]
+            count = spec['count']
+            self._levels[level] = {
+                'ids': column(spec['ids'], 'Q', count),
+                'latitude': column(spec['latitude'], coordinates, count),
+                'longitude': column(spec['longitude'], coordinates, count),
+                # Global row numbers, which index the name table
+                'names': range(spec['base'], spec['base'] + count),
+            }
+        total = sum(spec['count'] for spec in header['levels'].values())
+        names = header['names']
+        blob = view[data_start + names['blob']:data_start + names['blob'] + names['size']]
+        self._views.append(blob)
+        self._names = _NameTable(column(names['offsets'], 'I', total + 1), blob)
+
+    def close(self):
+        # Views over the mapping have to go before the mapping itself
+        self._levels = {}
+        self._names = None
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def memory_usage(self):
+        # Nothing is held outside the mapping but the header
+        return sys.getsizeof(self.header)
+
+def build_pack(path=PACK_PATH, base_dir='.', coordinates='d'):
+    registry = RegionRegistry.from_tree(base_dir)
+    data = pack_registry(registry, coordinates)
+    write_atomic(path, data)
+    return len(registry), len(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack the whole tree into one memory-mappable file.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--output', default=PACK_PATH, help=f"output file (default: {PACK_PATH})")
+    parser.add_argument('--float32', action='store_true',
+                        help="store coordinates as float32 (about 2 m precision) instead of float64")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    regions, size = build_pack(args.output, args.base_dir, 'f' if args.float32 else 'd')
+    print(f"Packed {regions} regions into {args.output} ({size / 1e6:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import argparse
+import gzip
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from bundle import OUTPUT_DIR as BUNDLE_DIR
+from change_plan import write_atomic
+from manifest import file_entry, file_unchanged, forget_file, load_manifest, save_manifest, settings_hash
+from tree_io import scan, scan_level
+from wilayah import LEVELS, PROPINSI_FILE, PROVINSI_FILE
+
+# Precompressed siblings for the published tree: provinsi.json gets
+# provinsi.json.gz and provinsi.json.br next to it, and so on for every id
+# file, so a server (static_server.py, or a CDN that supports it) can send the
+# compressed bytes without compressing on every request. Siblings are only
+# rebuilt for files whose content changed since the last run (see manifest.py)
+# and compression runs in a process pool. A sibling is only kept when it is
+# smaller than its source, and siblings of an encoding the run does not
+# produce are removed. .br needs the brotli package
+# (pip install brotli); without it only .gz files are written.
+MANIFEST_PATH = '.precompress_manifest.json'
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+# Encoding -> sibling suffix, in the order servers should prefer them
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+CHUNK_SIZE = 500
+
+def available_encodings():
+    return [e for e in SUFFIXES if e != 'br' or brotli is not None]
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    return brotli.compress(data, quality=BROTLI_QUALITY)
+
+def source_dirs():
+    # Directories holding published id files (bundle.py's output included)
+    return [spec['dir'] for spec in LEVELS.values() if spec['dir']] + [BUNDLE_DIR]
+
+def iter_source_files(base_dir='.'):
+    # Paths of every published JSON file, relative to base_dir
+    for name in (PROVINSI_FILE, PROPINSI_FILE):
+        if os.path.exists(os.path.join(base_dir, name)):
+            yield name
+    for directory in source_dirs():
+        if not os.path.isdir(os.path.join(base_dir, directory)):
+            continue
+        for _, entry in scan_level(os.path.join(base_dir, directory)):
+            yield os.path.join(directory, entry.name)
+
+def _compress_chunk(base_dir, paths, encodings):
+    # [(path, manifest entry, raw size, {encoding: size of the sibling written})].
+    # A sibling is only kept when it is smaller than the source; small
+    # record files often come out larger, and no server should send those.
+    results = []
+    for path in paths:
+        full_path = os.path.join(base_dir, path)
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        sizes = {}
+        for encoding in encodings:
+            compressed = compress(data, encoding)
+            sibling = full_path + SUFFIXES[encoding]
+            if len(compressed) < len(data):
+                write_atomic(sibling, compressed)
+                sizes[encoding] = len(compressed)
+            elif os.path.exists(sibling):
+                os.remove(sibling)
+        results.append((path, file_entry(full_path, data), len(data), sizes))
+    return results
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def siblings_present(base_dir, path, written):
+    # written: the encodings the last run kept a sibling for
+    full_path = os.path.join(base_dir, path)
+    return all(os.path.exists(full_path + SUFFIXES[e]) for e in written)
+
+def remove_stale(base_dir, sources, encodings):
+    # Siblings whose source file is gone, and siblings in an encoding this
+    # run does not produce (e.g. .br left from a run that had brotli), which
+    # would otherwise be served for a source that has changed since
+    removed = 0
+    suffixes = {SUFFIXES[e] for e in encodings}
+    for directory in ['.'] + source_dirs():
+        full_dir = os.path.join(base_dir, directory)
+        if not os.path.isdir(full_dir):
+            continue
+        # Listed up front (ordered), since files are removed as we go
+        for entry in scan(full_dir):
+            filename = entry.name
+            for suffix in SUFFIXES.values():
+                if not filename.endswith('.json' + suffix):
+                    continue
+                source = os.path.normpath(os.path.join(directory, filename[:-len(suffix)]))
+                if source not in sources or suffix not in suffixes:
+                    os.remove(os.path.join(full_dir, filename))
+                    removed += 1
+    return removed
+
+def precompress_tree(base_dir='.', workers=None, manifest=None):
+    encodings = available_encodings()
+    sources = list(iter_source_files(base_dir))
+
+    # Encodings that got a sibling, per source, from the last runs
+    written = manifest.setdefault('siblings', {}) if manifest is not None else {}
+    pending = []
+    for path in sources:
+        key = os.path.join(base_dir, path)
+        if (manifest is not None and file_unchanged(manifest, key) and key in written
+                and siblings_present(base_dir, path, written[key])):
+            continue
+        if manifest is not None:
+            forget_file(manifest, key)
+        pending.append(path)
+    print(f"Skipped {len(sources) - len(pending)} unchanged files, compressing {len(pending)} "
+          f"({', '.join(encodings)})")
+
+    # Bytes served per encoding (the source itself where no sibling is
+    # kept) and siblings kept
+    totals = {'raw': 0, **{e: 0 for e in encodings}}
+    kept = {e: 0 for e in encodings}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_compress_chunk, base_dir, chunk, encodings)
+                   for chunk in chunked(pending, CHUNK_SIZE)]
+        for future in futures:
+            for path, entry, raw_size, sizes in future.result():
+                if manifest is not None:
+                    key = os.path.join(base_dir, path)
+                    manifest['files'][key] = entry
+                    written[key] = sorted(sizes)
+                totals['raw'] += raw_size
+                for encoding in encodings:
+                    totals[encoding] += sizes.get(encoding, raw_size)
+                    kept[encoding] += encoding in sizes
+
+    source_set = set(os.path.normpath(p) for p in sources)
+    removed = remove_stale(base_dir, source_set, encodings)
+    if removed:
+        print(f"Removed {removed} siblings without a source file or in an encoding no longer produced")
+    if manifest is not None:
+        for key in [k for k in written if os.path.normpath(os.path.relpath(k, base_dir)) not in source_set]:
+            del written[key]
+    if pending:
+        summary = ', '.join(f"{e} {totals[e] / totals['raw']:.0%} ({kept[e]} siblings kept)"
+                            for e in encodings)
+        print(f"Compressed {totals['raw']} bytes in {len(pending)} files; served size: {summary}")
+    return len(pending)
+
+def main():
+    parser = argparse.ArgumentParser(description="Write .json.gz/.json.br siblings for the published tree.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--full', action='store_true', help="ignore the manifest and recompress every file")
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed, writing .gz files only.")
+
+    manifest_path = os.path.join(args.base_dir, MANIFEST_PATH)
+    manifest = load_manifest(manifest_path, settings_hash(
+        None, encodings=available_encodings(), gzip_level=GZIP_LEVEL, brotli_quality=BROTLI_QUALITY))
+    if args.full:
+        manifest['files'] = {}
+
+    start = time.perf_counter()
+    try:
+        precompress_tree(args.base_dir, args.workers, manifest)
+    finally:
+        save_manifest(manifest)
+    print(f"Done in {time.perf_counter() - start:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from fix_names import ngrams, normalize_name
+
+# Guess which reference province a list of kabupaten/kota names belongs to,
+# e.g. a new province id (the Papua splits) whose own name is not in the CSV.
+# Every reference kab/kota name is indexed by its character bigrams; each
+# child name is compared against all of them at once through the postings and
+# votes for the province of its closest reference name. The province with the
+# most votes wins, and its share of the names is the confidence.
+DICE_THRESHOLD = 0.75
+
+class ProvinceVoteIndex:
+    def __init__(self, reference):
+        # reference: {province: iterable of kab/kota names}
+        self.provinces = list(reference)
+        self._entry_province = []
+        self._entry_size = []
+        self._exact = {}
+        self._grams = {}
+        for code, province in enumerate(self.provinces):
+            for name in reference[province]:
+                key = normalize_name(name)
+                entry = len(self._entry_province)
+                self._entry_province.append(code)
+                grams = ngrams(key)
+                self._entry_size.append(len(grams))
+                self._exact.setdefault(key, set()).add(code)
+                for gram in grams:
+                    self._grams.setdefault(gram, []).append(entry)
+
+    def _vote(self, name, threshold):
+        # Province codes the name votes for (several on a tie), or ()
+        key = normalize_name(name)
+        exact = self._exact.get(key)
+        if exact:
+            return exact
+        grams = ngrams(key)
+        if not grams:
+            return ()
+        shared = {}
+        for gram in grams:
+            for entry in self._grams.get(gram, ()):
+                shared[entry] = shared.get(entry, 0) + 1
+        best = 0.0
+        codes = set()
+        for entry, count in shared.items():
+            dice = 2 * count / (len(grams) + self._entry_size[entry])
+            if dice > best:
+                best = dice
+                codes = {self._entry_province[entry]}
+            elif dice == best:
+                codes.add(self._entry_province[entry])
+        return codes if best >= threshold else ()
+
+    def scores(self, names, threshold=DICE_THRESHOLD):
+        # {province: votes} over all names; a tied name splits its vote
+        votes = [0.0] * len(self.provinces)
+        for name in names:
+            codes = self._vote(name, threshold)
+            for code in codes:
+                votes[code] += 1 / len(codes)
+        return {self.provinces[c]: v for c, v in enumerate(votes) if v}
+
+    def infer(self, names, threshold=DICE_THRESHOLD):
+        # (province, votes, confidence) for the best province, confidence
+        # being the share of names that voted for it; (None, 0, 0.0) if no
+        # name matched anything
+        names = list(names)
+        scores = self.scores(names, threshold)
+        if not scores:
+            return None, 0, 0.0
+        province = max(scores, key=scores.get)
+        return province, scores[province], scores[province] / len(names)
@@ -0,0 +1,209 @@
+import sys
+from array import array
+from bisect import bisect_left
+
+from wilayah_db import TABLES, iter_rows
+
+# Compact in-memory registry of every region in the tree.
+# Instead of one dict per region (what json.load gives), each level keeps
+# parallel typed arrays sorted by id:
+#   ids        array('q')  integer ids (1101012001)
+#   latitude   array('d')
+#   longitude  array('d')
+#   names      array('I')  index into one shared table of interned names
+# Region objects are light __slots__ views created on access. Parents and
+# children are found through the id prefix, e.g. the children of kecamatan
+# 110101 are the kelurahan ids in [1101010000, 1101020000).
+LEVEL_NAMES = TABLES
+
+ID_LENGTHS = {'provinsi': 2, 'kabupaten': 4, 'kecamatan': 6, 'kelurahan': 10}
+LEVEL_BY_ID_LEN = {length: level for level, length in ID_LENGTHS.items()}
+CHILD_LEVEL = {'provinsi': 'kabupaten', 'kabupaten': 'kecamatan', 'kecamatan': 'kelurahan'}
+PARENT_LEVEL = {child: parent for parent, child in CHILD_LEVEL.items()}
+
+class Region:
+    __slots__ = ('_registry', '_level', '_pos')
+
+    def __init__(self, registry, level, pos):
+        self._registry = registry
+        self._level = level
+        self._pos = pos
+
+    @property
+    def level(self):
+        return self._level
+
+    @property
+    def id(self):
+        # Same string form as the JSON files
+        return str(self._registry._levels[self._level]['ids'][self._pos])
+
+    @property
+    def nama(self):
+        columns = self._registry._levels[self._level]
+        return self._registry._names[columns['names'][self._pos]]
+
+    @property
+    def latitude(self):
+        return self._registry._levels[self._level]['latitude'][self._pos]
+
+    @property
+    def longitude(self):
+        return self._registry._levels[self._level]['longitude'][self._pos]
+
+    @property
+    def parent(self):
+        return self._registry.parent_of(self.id)
+
+    def children(self):
+        return self._registry.children_of(self.id)
+
+    def ancestry(self):
+        # [provinsi, ..., self]
+        chain = [self]
+        parent = self.parent
+        while parent is not None:
+            chain.append(parent)
+            parent = parent.parent
+        return chain[::-1]
+
+    def to_dict(self):
+        return {'id': self.id, 'nama': self.nama, 'latitude': self.latitude, 'longitude': self.longitude}
+
+    def __eq__(self, other):
+        return (isinstance(other, Region) and self._registry is other._registry
+                and self._level == other._level and self._pos == other._pos)
+
+    def __hash__(self):
+        return hash((self._level, self._pos))
+
+    def __repr__(self):
+        return f"Region({self._level}, {self.id}, {self.nama!r})"
+
+class RegionRegistry:
+    def __init__(self, rows):
+        # rows: (id, parent id, nama, latitude, longitude), the shape of
+        # wilayah_db.iter_rows. The first row per id wins.
+        names = []
+        name_ids = {}
+        by_level = {level: {} for level in LEVEL_NAMES}
+        for region_id, _, nama, lat, lon in rows:
+            level = LEVEL_BY_ID_LEN.get(len(region_id))
+            if level is None or region_id in by_level[level]:
+                continue
+            name_id = name_ids.get(nama)
+            if name_id is None:
+                name_id = name_ids[nama] = len(names)
+                names.append(sys.intern(nama))
+            by_level[level][region_id] = (int(region_id), lat or 0.0, lon or 0.0, name_id)
+
+        self._names = names
+        self._levels = {}
+        for level, entries in by_level.items():
+            records = sorted(entries.values())
+            self._levels[level] = {
+                'ids': array('q', [r[0] for r in records]),
+                'latitude': array('d', [r[1] for r in records]),
+                'longitude': array('d', [r[2] for r in records]),
+                'names': array('I', [r[3] for r in records]),
+            }
+
+    @classmethod
+    def from_tree(cls, base_dir='.'):
+        # Loads the list files of every level (see wilayah_db.iter_rows)
+        return cls(row for table in LEVEL_NAMES for row in iter_rows(base_dir, table))
+
+    def __len__(self):
+        return sum(len(columns['ids']) for columns in self._levels.values())
+
+    def __iter__(self):
+        for level in LEVEL_NAMES:
+            yield from self.iter_level(level)
+
+    def __contains__(self, region_id):
+        return self.get(region_id) is not None
+
+    def count(self, level):
+        return len(self._levels[level]['ids'])
+
+    def iter_level(self, level):
+        for pos in range(len(self._levels[level]['ids'])):
+            yield Region(self, level, pos)
+
+    def region_at(self, level, pos):
+        return Region(self, level, pos)
+
+    def columns(self, level):
+        # The raw arrays of a level (ids, latitude, longitude, names), for
+        # vectorized consumers
+        return self._levels[level]
+
+    def name_table(self):
+        return self._names
+
+    def get(self, region_id):
+        # Region for an id (str or int) of any level, or None for unknown and
+        # malformed ids
+        region_id = str(region_id)
+        level = LEVEL_BY_ID_LEN.get(len(region_id))
+        if level is None or not (region_id.isascii() and region_id.isdigit()):
+            return None
+        ids = self._levels[level]['ids']
+        key = int(region_id)
+        pos = bisect_left(ids, key)
+        if pos < len(ids) and ids[pos] == key:
+            return Region(self, level, pos)
+        return None
+
+    def __getitem__(self, region_id):
+        region = self.get(region_id)
+        if region is None:
+            raise KeyError(region_id)
+        return region
+
+    def parent_of(self, region_id):
+        region_id = str(region_id)
+        level = LEVEL_BY_ID_LEN.get(len(region_id))
+        parent_level = PARENT_LEVEL.get(level)
+        if parent_level is None:
+            return None
+        return self.get(region_id[:ID_LENGTHS[parent_level]])
+
+    def children_of(self, region_id=None):
+        # Direct children (provinces for None), in id order
+        if region_id is None:
+            return list(self.iter_level('provinsi'))
+        region_id = str(region_id)
+        level = LEVEL_BY_ID_LEN.get(len(region_id))
+        child_level = CHILD_LEVEL.get(level)
+        if child_level is None or not (region_id.isascii() and region_id.isdigit()):
+            return []
+        start, stop = self.child_range(region_id)
+        return [Region(self, child_level, pos) for pos in range(start, stop)]
+
+    def child_range(self, region_id):
+        # (start, stop) positions of the children of region_id in the child
+        # level's arrays; (0, 0) for malformed ids and kelurahan
+        region_id = str(region_id)
+        child_level = CHILD_LEVEL.get(LEVEL_BY_ID_LEN.get(len(region_id)))
+        if child_level is None:
+            return 0, 0
+        return self.descendant_range(region_id, child_level)
+
+    def descendant_range(self, region_id, level):
+        # (start, stop) positions, in level's arrays, of the regions of that
+        # (deeper) level under region_id; (0, 0) for malformed ids
+        region_id = str(region_id)
+        if not (region_id.isascii() and region_id.isdigit()) or len(region_id) > ID_LENGTHS[level]:
+            return 0, 0
+        scale = 10 ** (ID_LENGTHS[level] - len(region_id))
+        ids = self._levels[level]['ids']
+        low = int(region_id) * scale
+        return bisect_left(ids, low), bisect_left(ids, low + scale)
+
+    def memory_usage(self):
+        # Approximate bytes held by the arrays and the name table
+        total = sys.getsizeof(self._names) + sum(sys.getsizeof(n) for n in self._names)
+        for columns in self._levels.values():
+            total += sum(a.itemsize * len(a) for a in columns.values())
+        return total
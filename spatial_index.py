@@ -0,0 +1,165 @@
+import argparse
+import heapq
+import json
+import math
+from array import array
+
+from region_registry import RegionRegistry
+
+# Reverse geocoding: GPS point -> nearest kelurahan/kecamatan with its chain.
+# Points are bucketed in a regular lat/lon grid. A query scans rings of cells
+# around the query cell and stops once the k nearest found so far are closer
+# than anything outside the rings can be, so only a few cells are looked at
+# instead of all ~90k points. Regions without coordinates (0, 0) are skipped.
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+DEFAULT_LEVELS = ('kecamatan', 'kelurahan')
+DEFAULT_CELL_SIZE = 0.1  # degrees, ~11 km
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def describe(region, distance):
+    # JSON-ready result with the provinsi -> ... -> region chain
+    return {
+        'id': region.id,
+        'nama': region.nama,
+        'level': region.level,
+        'distance_km': round(distance, 3),
+        'chain': [{'id': r.id, 'nama': r.nama, 'level': r.level} for r in region.ancestry()],
+    }
+
+class SpatialIndex:
+    def __init__(self, registry, levels=DEFAULT_LEVELS, cell_size=DEFAULT_CELL_SIZE):
+        self.registry = registry
+        self.levels = tuple(levels)
+        self.cell_size = cell_size
+
+        # Point columns; point -> (level, registry position)
+        self._lat = array('d')
+        self._lon = array('d')
+        self._level = array('B')
+        self._pos = array('I')
+        self._cells = {}
+
+        for level_code, level in enumerate(self.levels):
+            columns = registry.columns(level)
+            for pos, (lat, lon) in enumerate(zip(columns['latitude'], columns['longitude'])):
+                if lat == 0 and lon == 0:
+                    continue
+                point = len(self._lat)
+                self._lat.append(lat)
+                self._lon.append(lon)
+                self._level.append(level_code)
+                self._pos.append(pos)
+                self._cells.setdefault(self._cell(lat, lon), array('I')).append(point)
+
+        cells = list(self._cells)
+        self._row_range = (min(c[0] for c in cells), max(c[0] for c in cells)) if cells else (0, 0)
+        self._col_range = (min(c[1] for c in cells), max(c[1] for c in cells)) if cells else (0, 0)
+        self._max_abs_lat = max((abs(v) for v in self._lat), default=0.0)
+
+    def __len__(self):
+        return len(self._lat)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _ring(self, row, col, r):
+        # Cells at Chebyshev distance r from (row, col) that hold points,
+        # clipped to the rows/columns that have any
+        row_lo, row_hi = self._row_range
+        col_lo, col_hi = self._col_range
+        cells = self._cells
+        if r == 0:
+            if (row, col) in cells:
+                yield cells[(row, col)]
+            return
+        c_from, c_to = max(col - r, col_lo), min(col + r, col_hi)
+        for rr in (row - r, row + r):
+            if row_lo <= rr <= row_hi:
+                for c in range(c_from, c_to + 1):
+                    cell = cells.get((rr, c))
+                    if cell is not None:
+                        yield cell
+        r_from, r_to = max(row - r + 1, row_lo), min(row + r - 1, row_hi)
+        for c in (col - r, col + r):
+            if col_lo <= c <= col_hi:
+                for rr in range(r_from, r_to + 1):
+                    cell = cells.get((rr, c))
+                    if cell is not None:
+                        yield cell
+
+    def _ring_span(self, row, col):
+        # First ring that can hold points and the ring that covers them all
+        row_lo, row_hi = self._row_range
+        col_lo, col_hi = self._col_range
+        first = max(0, row_lo - row, row - row_hi, col_lo - col, col - col_hi)
+        last = max(abs(row - row_lo), abs(row - row_hi), abs(col - col_lo), abs(col - col_hi))
+        return first, last
+
+    def _ring_bound_km(self, lat, r):
+        # Anything outside rings 0..r is at least this far away: r cells of
+        # latitude, or r cells of longitude at the widest latitude involved
+        widest = min(89.9, max(abs(lat), self._max_abs_lat) + (r + 1) * self.cell_size)
+        cell_km = self.cell_size * KM_PER_DEGREE * min(1.0, math.cos(math.radians(widest)))
+        return r * cell_km
+
+    def k_nearest(self, lat, lon, k=5, level=None):
+        # [(Region, distance km)] of the k nearest points, nearest first.
+        # level limits the search to one of the indexed levels.
+        if not self._lat or k <= 0:
+            return []
+        level_code = self.levels.index(level) if level is not None else None
+        row, col = self._cell(lat, lon)
+        best = []  # max-heap of (-distance, point)
+        r, last_ring = self._ring_span(row, col)
+        while r <= last_ring:
+            for cell in self._ring(row, col, r):
+                for point in cell:
+                    if level_code is not None and self._level[point] != level_code:
+                        continue
+                    d = haversine_km(lat, lon, self._lat[point], self._lon[point])
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, point))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, point))
+            if len(best) == k and -best[0][0] <= self._ring_bound_km(lat, r):
+                break
+            r += 1
+
+        results = sorted((-neg_d, point) for neg_d, point in best)
+        return [(self.registry.region_at(self.levels[self._level[p]], self._pos[p]), d)
+                for d, p in results]
+
+    def nearest(self, lat, lon, level=None):
+        found = self.k_nearest(lat, lon, 1, level)
+        return found[0] if found else None
+
+    def resolve(self, lat, lon, level=None):
+        # Nearest region as a dict with its provinsi -> ... chain, or None
+        found = self.nearest(lat, lon, level)
+        if found is None:
+            return None
+        return describe(*found)
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest regions for a latitude/longitude.")
+    parser.add_argument('latitude', type=float)
+    parser.add_argument('longitude', type=float)
+    parser.add_argument('-k', type=int, default=1, help="number of nearest regions (default: 1)")
+    parser.add_argument('--level', choices=DEFAULT_LEVELS)
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    args = parser.parse_args()
+
+    index = SpatialIndex(RegionRegistry.from_tree(args.base_dir))
+    results = [describe(region, distance)
+               for region, distance in index.k_nearest(args.latitude, args.longitude, args.k, args.level)]
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
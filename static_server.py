@@ -0,0 +1,91 @@
+import argparse
+import os
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from precompress import SUFFIXES
+
+# Local static server for testing the published tree with the siblings that
+# precompress.py writes. A request for kota/11.json is answered from
+# kota/11.json.br or kota/11.json.gz when the client's Accept-Encoding allows
+# it and the sibling is smaller and not older than the file, with
+# Content-Encoding set and the JSON content type kept; otherwise the plain
+# file is sent as usual.
+#
+#   python precompress.py && python static_server.py
+#   curl -sI -H 'Accept-Encoding: br, gzip' http://127.0.0.1:8000/kota/11.json
+
+def accepted_encodings(header):
+    # Encodings from an Accept-Encoding header that we have siblings for, best
+    # first: by q-value, then in SUFFIXES order
+    weights = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == '*':
+            for encoding in SUFFIXES:
+                weights.setdefault(encoding, q)
+        elif coding in SUFFIXES:
+            weights[coding] = q
+    order = list(SUFFIXES)
+    return sorted((e for e, q in weights.items() if q > 0), key=lambda e: (-weights[e], order.index(e)))
+
+class PrecompressedHandler(SimpleHTTPRequestHandler):
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            source = os.stat(path)
+            for encoding in accepted_encodings(self.headers.get('Accept-Encoding')):
+                compressed = path + SUFFIXES[encoding]
+                try:
+                    st = os.stat(compressed)
+                except OSError:
+                    continue
+                # Tiny record files can come out larger than the original,
+                # and a sibling older than its source is out of date
+                if st.st_size >= source.st_size or st.st_mtime_ns < source.st_mtime_ns:
+                    continue
+                f = open(compressed, 'rb')
+                self.send_response(200)
+                self.send_header('Content-Type', self.guess_type(path))
+                self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(st.st_size))
+                self.send_header('Last-Modified', self.date_time_string(st.st_mtime))
+                self.end_headers()
+                return f
+        return super().send_head()
+
+    def end_headers(self):
+        # Responses depend on Accept-Encoding, so caches must keep them apart
+        self.send_header('Vary', 'Accept-Encoding')
+        super().end_headers()
+
+    def guess_type(self, path):
+        if path.endswith('.json'):
+            return 'application/json; charset=utf-8'
+        return super().guess_type(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the tree, using precompressed siblings when accepted.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    handler = partial(PrecompressedHandler, directory=args.base_dir)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Serving {os.path.abspath(args.base_dir)} on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
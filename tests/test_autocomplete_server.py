@@ -0,0 +1,44 @@
+from autocomplete_server import CACHED_TOP, AutocompleteIndex
+from region_registry import RegionRegistry
+
+
+def make_index():
+    # 3 provinces of 60 kabupaten each and a few kecamatan; every kabupaten
+    # and kecamatan name starts with 'a'
+    rows = []
+    for p in range(11, 14):
+        rows.append((str(p), None, f"Provinsi {p}", 0.0, 0.0))
+        for k in range(1, 61):
+            rows.append((f"{p}{k:02d}", str(p), f"Alas {p} {k}", 0.0, 0.0))
+    for c in range(1, 4):
+        rows.append((f"1101{c:02d}", '1101', f"Alur {c}", 0.0, 0.0))
+    return AutocompleteIndex(RegionRegistry(rows))
+
+
+def test_cached_prefix_does_not_sort_the_full_range():
+    index = make_index()
+    assert len(index._name_cache['a']) > CACHED_TOP
+
+    def full_range(query):
+        raise AssertionError(f"full range sorted for {query!r}")
+
+    index._name_range_keys = full_range
+    results = index.search('a', 10)
+    assert [r['nama'] for r in results[:3]] == ['Alas 11 1', 'Alas 11 2', 'Alas 11 3']
+    assert len(index.search('a', CACHED_TOP)) == CACHED_TOP
+
+
+def test_filter_past_the_cached_top_falls_back_to_the_full_range():
+    index = make_index()
+    calls = []
+    full_range = index._name_range_keys
+
+    def spy(query):
+        calls.append(query)
+        return full_range(query)
+
+    index._name_range_keys = spy
+    # Kecamatan rank after every kabupaten, past the cached top
+    results = index.search('a', 10, level='kecamatan')
+    assert [r['id'] for r in results] == ['110101', '110102', '110103']
+    assert calls == ['a']
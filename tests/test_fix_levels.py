@@ -0,0 +1,29 @@
+from fix_levels import match, tree_ids
+
+
+def test_partial_reference_does_not_reuse_sibling_names():
+    # 110101 is missing from the reference; its closest reference name
+    # belongs to 110102, which is in the tree
+    reference = {'1101': {'110102': 'Pulau Banyak Barat', '110103': 'Pulau Banyak Timur'}}
+    parsed = [
+        ('kecamatan/1101.json', [{'id': '110101', 'nama': 'Pulau Banyak'},
+                                 {'id': '110102', 'nama': 'Pulau Banyak Barat'}]),
+        ('kecamatan/110101.json', [{'id': '110101', 'nama': 'Pulau Banyak'}]),
+        ('kecamatan/110102.json', [{'id': '110102', 'nama': 'Pulau Banyak Barat'}]),
+    ]
+    stats = {'checked': 0, 'by_id': 0, 'no_reference': 0, 'unmatched': 0}
+    changes = dict(match(parsed, reference, 6, stats=stats))
+    names = {}
+    for path, entries in parsed:
+        for entry in entries:
+            names[entry['id']] = changes.get(path, {}).get(entry['id'], (None, entry['nama']))[1]
+    assert names['110101'] != names['110102']
+    # 110103 is not in the tree, so it is still there for the fuzzy match
+    assert changes['kecamatan/110101.json']['110101'] == ('Pulau Banyak', 'Pulau Banyak Timur')
+    assert stats['by_id'] == 2
+
+
+def test_tree_ids_groups_record_files_by_parent(tmp_path):
+    for name in ('1101.json', '110101.json', '110102.json', '110201.json', 'notes.txt'):
+        (tmp_path / name).write_text('{}')
+    assert tree_ids(str(tmp_path), 6) == {'1101': {'110101', '110102'}, '1102': {'110201'}}
@@ -0,0 +1,28 @@
+import random
+
+import pytest
+
+from fix_names import build_match_index, find_best_match
+
+
+@pytest.mark.parametrize('threshold', [0.7, 0.75, 0.8, 0.85, 0.9])
+def test_index_matches_linear_scan_on_short_names(threshold):
+    # Short names are where the bigram shortlist has to fall back to
+    # checking candidates by length
+    rng = random.Random(threshold)
+    for _ in range(3000):
+        candidates = [''.join(rng.choice('ABCE ') for _ in range(rng.randint(1, 5)))
+                      for _ in range(rng.randint(1, 6))]
+        name = ''.join(rng.choice('ABCE ') for _ in range(rng.randint(1, 5)))
+        index = build_match_index(candidates)
+        assert find_best_match(name, candidates, threshold, index) == \
+            find_best_match(name, candidates, threshold), (name, candidates)
+
+
+def test_index_finds_five_character_pairs():
+    # Combined length 5 at 0.8 needs the length fallback: 'AC' shares no
+    # bigram with 'A C', 'ECE' none with 'EE'
+    assert find_best_match('A C ', ['Kabupaten AC'], index=build_match_index(['Kabupaten AC'])) == \
+        'Kabupaten AC'
+    candidates = ['ECE', 'AEE']
+    assert find_best_match('EE', candidates, index=build_match_index(candidates)) == 'ECE'
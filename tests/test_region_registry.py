@@ -0,0 +1,24 @@
+import pytest
+
+from region_registry import RegionRegistry
+
+
+@pytest.fixture
+def registry():
+    return RegionRegistry([('11', None, 'Aceh', 0.0, 0.0),
+                           ('1101', '11', 'Kab. Simeulue', 0.0, 0.0),
+                           ('110101', '1101', 'Teupah Selatan', 0.0, 0.0)])
+
+
+@pytest.mark.parametrize('region_id', ['1x', '11x1', '１１', '', '1101012001x'])
+def test_malformed_ids_have_no_children(registry, region_id):
+    assert registry.get(region_id) is None
+    assert registry.children_of(region_id) == []
+    assert registry.child_range(region_id) == (0, 0)
+    assert registry.descendant_range(region_id, 'kecamatan') == (0, 0)
+
+
+def test_children_and_ranges(registry):
+    assert [r.id for r in registry.children_of('11')] == ['1101']
+    assert registry.child_range('1101') == (0, 1)
+    assert registry.descendant_range('11', 'kecamatan') == (0, 1)
@@ -0,0 +1,11 @@
+import sqlite3
+
+import pytest
+
+from wilayah_db import search
+
+
+def test_search_rejects_unknown_level():
+    conn = sqlite3.connect(':memory:')
+    with pytest.raises(ValueError):
+        search(conn, 'aceh', level='provinsi WHERE 1 = 1 --')
@@ -0,0 +1,167 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Bulk file access for the tree. The kelurahan directory alone holds ~90k
+# files, and on a network filesystem or a cold cache the time goes to the
+# latency of each stat and open, not to parsing. So:
+#   - directories are walked with os.scandir, which gets names and file
+#     types from one directory read instead of a listdir plus a stat per file
+#   - files are read and written from a bounded thread pool, many requests
+#     in flight at once. At most `window` calls are pending, so memory stays
+#     bounded however many files there are, and results come back either in
+#     input order (ordered=True) or as soon as each one is done.
+# This module sits below wilayah.py and knows nothing about the JSON; pass
+# wilayah.parse_json (or use wilayah.read_json_files) to get parsed data.
+WORKERS = 16
+BATCH_SIZE = 8
+
+def file_id(filename):
+    # '1101.json' -> '1101', None for anything that is not a numeric id file
+    if not filename.endswith('.json'):
+        return None
+    region_id = filename[:-5]
+    if not region_id.isdigit():
+        return None
+    return region_id
+
+def scan(directory, ordered=True):
+    # os.DirEntry of every regular file in directory, sorted by name when
+    # ordered, else in directory order as they are read. Nothing for a
+    # missing directory.
+    try:
+        iterator = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with iterator:
+        entries = (entry for entry in iterator if entry.is_file())
+        if not ordered:
+            yield from entries
+            return
+        entries = sorted(entries, key=lambda entry: entry.name)
+    yield from entries
+
+def scan_level(directory, id_lengths=None, ordered=True):
+    # (id, os.DirEntry) for the id files in directory whose id length is in
+    # id_lengths (any length when None)
+    for entry in scan(directory, ordered):
+        region_id = file_id(entry.name)
+        if region_id is not None and (id_lengths is None or len(region_id) in id_lengths):
+            yield region_id, entry
+
+def bounded_map(fn, items, workers=WORKERS, ordered=True, window=None):
+    # (item, fn(item)) for every item, fn running on a thread pool with at
+    # most window calls pending (default 4 per worker). items is consumed
+    # lazily. An exception from fn is raised when its result is reached.
+    window = window or workers * 4
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if ordered:
+            pending = deque()
+            for item in items:
+                if len(pending) >= window:
+                    done_item, future = pending.popleft()
+                    yield done_item, future.result()
+                pending.append((item, pool.submit(fn, item)))
+            while pending:
+                done_item, future = pending.popleft()
+                yield done_item, future.result()
+        else:
+            pending = {}
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < window:
+                    item = next(items, StopIteration)
+                    if item is StopIteration:
+                        exhausted = True
+                    else:
+                        pending[pool.submit(fn, item)] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def batched(items, size):
+    # Lists of up to size consecutive items
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def read_files(paths, parse=None, workers=WORKERS, ordered=True, return_exceptions=False,
+               batch_size=BATCH_SIZE):
+    # (path, content) for every path: the raw bytes, or parse(bytes) when
+    # given. With return_exceptions an unreadable or unparsable file gives
+    # its exception as content instead of raising. Each pool task reads
+    # batch_size files, which keeps the per-task overhead small next to a
+    # warm-cache read.
+    def read(path):
+        try:
+            data = read_bytes(path)
+            return parse(data) if parse is not None else data
+        except Exception as e:
+            if return_exceptions:
+                return e
+            raise
+
+    def read_batch(batch):
+        return [read(path) for path in batch]
+
+    for batch, contents in bounded_map(read_batch, batched(paths, batch_size), workers, ordered):
+        yield from zip(batch, contents)
+
+def write_file(path, content):
+    # content is str (written as UTF-8) or bytes
+    if isinstance(content, bytes):
+        with open(path, 'wb') as f:
+            f.write(content)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+class FileWriter:
+    # Writes files in the background as they are produced, with at most
+    # window writes pending. write defaults to write_file; pass
+    # change_plan.write_atomic for files that readers may have open.
+    def __init__(self, workers=WORKERS, window=None, write=write_file):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.window = window or workers * 16
+        self.write_fn = write
+        self.written = 0
+
+    def write(self, path, content):
+        while len(self.pending) >= self.window:
+            self.pending.popleft().result()
+        self.pending.append(self.pool.submit(self.write_fn, path, content))
+        self.written += 1
+
+    def close(self):
+        # Waits for every pending write; raises the first failure
+        try:
+            while self.pending:
+                self.pending.popleft().result()
+        finally:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_files(items, workers=WORKERS, write=write_file):
+    # Writes every (path, content) of items; returns the number of files
+    with FileWriter(workers, write=write) as writer:
+        for path, content in items:
+            writer.write(path, content)
+    return writer.written
@@ -4,6 +4,8 @@ import os
 import csv
 import difflib
 
+from province_votes import ProvinceVoteIndex
+
 CSV_PATH = '/Users/syamil/Documents/data-indonesia/referensi/master_prov_kabupaten_kota.csv'
 BASE_DIR = '/Users/syamil/Documents/data-indonesia'
 KAB_DIR = os.path.join(BASE_DIR, 'kabupaten')
@@ -53,32 +55,21 @@ for f in files:
         elif len(f.split('.')[0]) == 4:
             used_ids.add(f.split('.')[0][:2])
 
-for pid in used_ids:
+vote_index = ProvinceVoteIndex({cp: csv_data[cp].values() for cp in all_csv_provs})
+
+for pid in sorted(used_ids):
     if pid not in id_to_csv_prov:
         list_file = os.path.join(KAB_DIR, f"{pid}.json")
         if os.path.exists(list_file):
             with open(list_file, 'r') as f:
                 try:
                     data = json.load(f)
-                    names = [x['nama'].lower() for x in data if 'nama' in x][:10]
-                    best_prov = None
-                    max_matches = 0
-                    for cp in all_csv_provs:
-                        matches = 0
-                        cp_kabs = csv_data[cp]
-                        for n in names:
-                            if n in cp_kabs: 
-                                matches += 1
-                                continue
-                            if difflib.get_close_matches(n, cp_kabs.keys(), n=1, cutoff=0.8):
-                                matches += 1
-                        
-                        if matches > max_matches:
-                            max_matches = matches
-                            best_prov = cp
-                    
-                    if best_prov and max_matches > 0:
-                        print(f"Content-based mapping: ID {pid} -> {best_prov} (Matches: {max_matches})")
+                    # Every child name votes, scored against all provinces at once
+                    names = [x['nama'] for x in data if 'nama' in x]
+                    best_prov, votes, confidence = vote_index.infer(names)
+                    if best_prov:
+                        print(f"Content-based mapping: ID {pid} -> {best_prov} "
+                              f"(Matches: {votes:g}/{len(names)}, confidence {confidence:.2f})")
                         id_to_csv_prov[pid] = best_prov
                 except:
                     pass
@@ -1,9 +1,12 @@
+import argparse
 import json
 import csv
 import os
 import re
 from difflib import get_close_matches, SequenceMatcher
 
+from change_plan import open_plan, write_change
+
 CSV_PATH = 'referensi/master_prov_kabupaten_kota.csv'
 PROVINSI_JSON_PATH = 'provinsi.json'
 PROPINSI_JSON_PATH = 'propinsi.json'
@@ -69,7 +72,7 @@ def load_csv():
             
     return provinces, kabupatens
 
-def update_provinces(provinces_map):
+def update_provinces(provinces_map, plan=None):
     files = [PROVINSI_JSON_PATH]
     if os.path.exists(PROPINSI_JSON_PATH):
         files.append(PROPINSI_JSON_PATH)
@@ -83,6 +86,7 @@ def update_provinces(provinces_map):
         updated = False
         for p in data:
             original_name = p['nama']
+            p_before = original_name
             norm_name = normalize_name(original_name)
             
             # Direct match on normalized name
@@ -112,16 +116,22 @@ def update_provinces(provinces_map):
                         print(f"Refined Prov Name: {original_name} -> {new_name}")
             
             province_id_to_name[p['id']] = p['nama']
+            if plan is not None and p['nama'] != p_before:
+                write_change(plan, fpath, p['id'], p_before, p['nama'])
 
-        if updated:
+        if updated and plan is None:
             with open(fpath, 'w') as f:
                 json.dump(data, f, indent=2)
                 f.write('\n') # Add newline at end
     
     return province_id_to_name
 
-def update_kabupatens(province_ids, csv_kabs):
-    # Iterate through all json files in kabupaten folder
+def update_kabupatens(province_ids, csv_kabs, plan=None):
+    # Iterate through all json files in kabupaten folder.
+    # kota/ holds the same lists; a kota file identical to its kabupaten file
+    # gets the same result written to it. Returns those filenames, so
+    # update_kota can skip them.
+    mirrored = set()
     for filename in os.listdir(KABUPATEN_DIR):
         if not filename.endswith('.json'):
             continue
@@ -139,8 +149,17 @@ def update_kabupatens(province_ids, csv_kabs):
         target_kabs_map = csv_kabs.get(current_prov_name)
         
         filepath = os.path.join(KABUPATEN_DIR, filename)
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw)
+
+        targets = [filepath]
+        mirror_path = os.path.join(KOTA_DIR, filename)
+        if os.path.exists(mirror_path):
+            with open(mirror_path, 'rb') as f:
+                if f.read() == raw:
+                    targets.append(mirror_path)
+                    mirrored.add(filename)
             
         updated = False
         for k in data:
@@ -174,6 +193,9 @@ def update_kabupatens(province_ids, csv_kabs):
                 if new_name != original_name:
                     k['nama'] = new_name
                     updated = True
+                    if plan is not None:
+                        for target in targets:
+                            write_change(plan, target, k['id'], original_name, new_name)
                     # print(f"Updated Kab ({current_prov_name}): {original_name} -> {new_name}")
             else:
                 # No CSV data for this province (e.g. new Papua provinces)
@@ -181,18 +203,25 @@ def update_kabupatens(province_ids, csv_kabs):
                 if new_name != original_name:
                     k['nama'] = new_name
                     updated = True
+                    if plan is not None:
+                        for target in targets:
+                            write_change(plan, target, k['id'], original_name, new_name)
                     # print(f"Refined Kab Name ({current_prov_name}): {original_name} -> {new_name}")
 
-        if updated:
-            with open(filepath, 'w') as f:
-                json.dump(data, f, indent=2)
-                # f.write('\n')
-            print(f"Updated {filename}")
+        if updated and plan is None:
+            for target in targets:
+                with open(target, 'w') as f:
+                    json.dump(data, f, indent=2)
+                    # f.write('\n')
+            print(f"Updated {filename}" + (" (kabupaten and kota)" if len(targets) > 1 else ""))
+
+    return mirrored
             
-def update_kota(province_ids, csv_kabs):
-    # Iterate through all json files in kabupaten folder
+def update_kota(province_ids, csv_kabs, plan=None, skip=()):
+    # Iterate through all json files in kota folder
+    # skip: filenames update_kabupatens already wrote here
     for filename in os.listdir(KOTA_DIR):
-        if not filename.endswith('.json'):
+        if not filename.endswith('.json') or filename in skip:
             continue
             
         prov_id = filename.replace('.json', '')
@@ -243,6 +272,8 @@ def update_kota(province_ids, csv_kabs):
                 if new_name != original_name:
                     k['nama'] = new_name
                     updated = True
+                    if plan is not None:
+                        write_change(plan, filepath, k['id'], original_name, new_name)
                     # print(f"Updated Kab ({current_prov_name}): {original_name} -> {new_name}")
             else:
                 # No CSV data for this province (e.g. new Papua provinces)
@@ -250,16 +281,27 @@ def update_kota(province_ids, csv_kabs):
                 if new_name != original_name:
                     k['nama'] = new_name
                     updated = True
+                    if plan is not None:
+                        write_change(plan, filepath, k['id'], original_name, new_name)
                     # print(f"Refined Kab Name ({current_prov_name}): {original_name} -> {new_name}")
 
-        if updated:
+        if updated and plan is None:
             with open(filepath, 'w') as f:
                 json.dump(data, f, indent=2)
                 # f.write('\n')
             print(f"Updated {filename}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plan', metavar='PATH',
+                        help="write the changes to a JSONL plan instead of rewriting files")
+    args = parser.parse_args()
+    plan = open_plan(args.plan) if args.plan else None
+
     csv_provinces, csv_kabs = load_csv()
-    final_prov_map = update_provinces(csv_provinces)
-    update_kabupatens(final_prov_map, csv_kabs)
-    update_kabupatens(final_prov_map, csv_kabs)
+    final_prov_map = update_provinces(csv_provinces, plan)
+    mirrored = update_kabupatens(final_prov_map, csv_kabs, plan)
+    update_kota(final_prov_map, csv_kabs, plan, skip=mirrored)
+
+    if plan is not None:
+        plan.close()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+from tree_io import scan
+from wilayah import (LEVELS, LIST_ID_LENGTHS, PROPINSI_FILE, PROVINSI_FILE, file_id, read_json,
+                     read_json_files)
+
+# Integrity check of the whole published tree, meant to gate a publish.
+# Workers check the list files of a level in chunks: each listed child must
+# have the parent's id as prefix, sane coordinates and a record file with the
+# same content. The main process then checks what needs the whole tree:
+# duplicate ids, children of parents that do not exist, record files no list
+# mentions, the kota/ and propinsi.json mirrors, and the total in README.md.
+# Issues are streamed as JSON lines as soon as each chunk is done, followed by
+# a summary line; the exit status is 1 when there are errors.
+README_PATH = 'README.md'
+
+# Indonesia with some margin (Sabang to Merauke, Miangas to Rote)
+LATITUDE_RANGE = (-11.5, 6.5)
+LONGITUDE_RANGE = (94.5, 141.5)
+
+RECORD_FIELDS = ('id', 'nama', 'latitude', 'longitude')
+
+CHUNK_SIZE = 250
+
+# Levels in parent-first order; kota mirrors kabupaten
+CHILD_LEVELS = ['kabupaten', 'kota', 'kecamatan', 'kelurahan']
+PARENT_LEVELS = {
+    'kabupaten': ['provinsi'],
+    'kota': ['provinsi'],
+    'kecamatan': ['kabupaten', 'kota'],
+    'kelurahan': ['kecamatan'],
+}
+
+def issue(check, severity, message, level=None, path=None, region_id=None):
+    return {'check': check, 'severity': severity, 'level': level, 'file': path,
+            'id': region_id, 'message': message}
+
+def coordinate_issues(entry, level, path):
+    region_id = entry.get('id')
+    lat, lon = entry.get('latitude'), entry.get('longitude')
+    if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+        return [issue('coordinates', 'error', f"non-numeric coordinates {lat!r}, {lon!r}",
+                      level, path, region_id)]
+    if lat == 0 and lon == 0:
+        return [issue('missing_coordinates', 'warning', "coordinates are 0, 0", level, path, region_id)]
+    if not (LATITUDE_RANGE[0] <= lat <= LATITUDE_RANGE[1]
+            and LONGITUDE_RANGE[0] <= lon <= LONGITUDE_RANGE[1]):
+        return [issue('coordinates', 'error', f"{lat}, {lon} is outside Indonesia", level, path, region_id)]
+    return []
+
+def check_list_files(directory, level, parent_ids, record_ids):
+    # Checks the list files of parent_ids in one level directory.
+    # record_ids: ids that have a record file in the directory.
+    # Returns (issues, [(parent id, [listed child ids])]).
+    # The list files of the chunk, then the record files they name, are read
+    # from a thread pool (tree_io.py); the checks run in file order.
+    spec = LEVELS[level]
+    record_ids = set(record_ids)
+    issues = []
+    listed = []
+    to_compare = []  # (listed entry, record path) for every listed id with a record file
+    list_paths = [os.path.join(directory, f"{parent}.json") for parent in parent_ids]
+    for parent, (path, data) in zip(parent_ids, read_json_files(list_paths, return_exceptions=True)):
+        if isinstance(data, Exception):
+            issues.append(issue('unreadable', 'error', str(data), level, path, parent))
+            continue
+        if not isinstance(data, list):
+            issues.append(issue('list_format', 'error', "list file does not hold a JSON array",
+                                level, path, parent))
+            continue
+
+        children = []
+        for entry in data:
+            if not isinstance(entry, dict) or 'id' not in entry:
+                issues.append(issue('list_format', 'error', f"entry without an id: {entry!r}",
+                                    level, path, parent))
+                continue
+            region_id = str(entry['id'])
+            children.append(region_id)
+            if len(region_id) != spec['id_len'] or not region_id.startswith(parent):
+                issues.append(issue('id_prefix', 'error',
+                                    f"{region_id} is not a {spec['id_len']} digit id under {parent}",
+                                    level, path, region_id))
+            if not entry.get('nama'):
+                issues.append(issue('missing_name', 'error', "empty nama", level, path, region_id))
+            issues.extend(coordinate_issues(entry, level, path))
+
+            # The record file must say the same
+            if region_id not in record_ids:
+                issues.append(issue('missing_record', 'error', "no record file for listed id",
+                                    level, path, region_id))
+                continue
+            to_compare.append((entry, os.path.join(directory, f"{region_id}.json")))
+        listed.append((parent, children))
+
+    record_paths = (record_path for _, record_path in to_compare)
+    for (entry, _), (record_path, record) in zip(to_compare,
+                                                 read_json_files(record_paths, return_exceptions=True)):
+        region_id = str(entry['id'])
+        if isinstance(record, Exception):
+            issues.append(issue('unreadable', 'error', str(record), level, record_path, region_id))
+            continue
+        if not isinstance(record, dict):
+            issues.append(issue('record_format', 'error', "record file does not hold a JSON object",
+                                level, record_path, region_id))
+            continue
+        differing = [f for f in RECORD_FIELDS if str(record.get(f)) != str(entry.get(f))
+                     and record.get(f) != entry.get(f)]
+        if differing:
+            detail = ', '.join(f"{f}: {entry.get(f)!r} in list, {record.get(f)!r} in record"
+                               for f in differing)
+            issues.append(issue('record_mismatch', 'error', detail, level, record_path, region_id))
+    return issues, listed
+
+def split_level_files(directory, level):
+    # (list file ids, record file ids, other file names) of a level directory
+    spec = LEVELS[level]
+    list_lengths = LIST_ID_LENGTHS[level]
+    lists, records, others = [], [], []
+    for entry in scan(directory):
+        filename = entry.name
+        region_id = file_id(filename)
+        if region_id is None:
+            if not filename.startswith('.'):
+                others.append(filename)
+        elif len(region_id) == spec['id_len']:
+            records.append(region_id)
+        elif len(region_id) == spec['parent_len']:
+            lists.append(region_id)
+        elif len(region_id) not in list_lengths:
+            others.append(filename)
+    return lists, records, others
+
+def readme_total(path=README_PATH):
+    # "total ada 91.219 data." -> 91219, or None
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        found = re.search(r'total ada ([\d.,]+) data', f.read())
+    if found is None:
+        return None
+    return int(re.sub(r'[^0-9]', '', found.group(1)))
+
+def validate_tree(base_dir='.', report=sys.stdout, workers=None):
+    counts = {'error': 0, 'warning': 0}
+    checked = {}
+
+    def emit(found):
+        for item in found:
+            counts[item['severity']] += 1
+            if item['file'] is not None:
+                item['file'] = os.path.relpath(item['file'], base_dir)
+            report.write(json.dumps(item, ensure_ascii=False) + '\n')
+        report.flush()
+
+    # Provinces and their mirror
+    ids_by_level = {}
+    # Ids that passed the id_prefix check, for the README total
+    valid_by_level = {}
+    provinsi_path = os.path.join(base_dir, PROVINSI_FILE)
+    provinces = read_json(provinsi_path)
+    province_ids = []
+    found = []
+    for entry in provinces:
+        region_id = str(entry.get('id', ''))
+        province_ids.append(region_id)
+        if len(region_id) != LEVELS['provinsi']['id_len']:
+            found.append(issue('id_prefix', 'error', f"{region_id} is not a 2 digit id",
+                               'provinsi', provinsi_path, region_id))
+        found.extend(coordinate_issues(entry, 'provinsi', provinsi_path))
+    propinsi_path = os.path.join(base_dir, PROPINSI_FILE)
+    if os.path.exists(propinsi_path) and read_json(propinsi_path) != provinces:
+        found.append(issue('mirror_mismatch', 'error', f"{PROPINSI_FILE} differs from {PROVINSI_FILE}",
+                           'provinsi', propinsi_path))
+    ids_by_level['provinsi'] = province_ids
+    valid_by_level['provinsi'] = {i for i in province_ids if len(i) == LEVELS['provinsi']['id_len']}
+    checked['provinsi'] = len(province_ids)
+    emit(found)
+
+    listed_by_level = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for level in CHILD_LEVELS:
+            directory = os.path.join(base_dir, LEVELS[level]['dir'])
+            if not os.path.isdir(directory):
+                emit([issue('missing_directory', 'error', f"{directory} does not exist", level)])
+                continue
+            lists, records, others = split_level_files(directory, level)
+            emit([issue('stray_file', 'warning', "not an id file of this level", level,
+                        os.path.join(directory, name)) for name in others])
+
+            futures = []
+            for start in range(0, len(lists), CHUNK_SIZE):
+                chunk = lists[start:start + CHUNK_SIZE]
+                # Only the record files that can belong to this chunk
+                chunk_records = records[bisect_left(records, chunk[0]):
+                                        bisect_left(records, chunk[-1] + '\uffff')]
+                futures.append(pool.submit(check_list_files, directory, level, chunk, chunk_records))
+
+            listed = []
+            for future in futures:
+                found, chunk_listed = future.result()
+                emit(found)
+                listed.extend(chunk_listed)
+            listed_by_level[level] = listed
+
+            # Whole-level checks
+            found = []
+            parents = {i for parent_level in PARENT_LEVELS[level] for i in ids_by_level.get(parent_level, ())}
+            seen = {}
+            valid = set()
+            for parent, children in listed:
+                if parent not in parents:
+                    found.append(issue('orphan', 'error', f"list file for unknown parent {parent}",
+                                       level, os.path.join(directory, f"{parent}.json"), parent))
+                for region_id in children:
+                    if region_id in seen:
+                        found.append(issue('duplicate_id', 'error', f"also listed under {seen[region_id]}",
+                                           level, os.path.join(directory, f"{parent}.json"), region_id))
+                    else:
+                        seen[region_id] = parent
+                    if len(region_id) == LEVELS[level]['id_len'] and region_id.startswith(parent):
+                        valid.add(region_id)
+            for region_id in records:
+                if region_id not in seen:
+                    found.append(issue('unlisted_record', 'error', "record file not in any list file",
+                                       level, os.path.join(directory, f"{region_id}.json"), region_id))
+            # Parents that should have a list file; an empty list is fine
+            parent_ids = {p for p, _ in listed}
+            for parent in sorted(parents):
+                if parent not in parent_ids:
+                    found.append(issue('missing_list', 'warning', "parent has no list file",
+                                       level, os.path.join(directory, f"{parent}.json"), parent))
+            emit(found)
+            ids_by_level[level] = list(seen)
+            valid_by_level[level] = valid
+            checked[level] = len(seen)
+
+    # kota/ is a copy of kabupaten/
+    found = []
+    kabupaten = dict(listed_by_level.get('kabupaten', ()))
+    kota = dict(listed_by_level.get('kota', ()))
+    for parent in sorted(set(kabupaten) | set(kota)):
+        if kabupaten.get(parent) != kota.get(parent):
+            found.append(issue('mirror_mismatch', 'error', "kota and kabupaten list different ids",
+                               'kota', os.path.join(base_dir, LEVELS['kota']['dir'], f"{parent}.json"),
+                               parent))
+
+    # README total: provinces, kabupaten/kota, kecamatan and kelurahan. Ids
+    # that failed the id_prefix check are already reported and not counted.
+    total = len(set().union(*valid_by_level.values()))
+    readme_path = os.path.join(base_dir, README_PATH)
+    expected = readme_total(readme_path)
+    if expected is None:
+        found.append(issue('readme_total', 'warning', f"no total found in {README_PATH}", path=readme_path))
+    elif expected != total:
+        found.append(issue('readme_total', 'error', f"README says {expected}, the tree has {total}",
+                           path=readme_path))
+    emit(found)
+
+    summary = {'summary': {'errors': counts['error'], 'warnings': counts['warning'],
+                           'regions': checked, 'total': total, 'readme_total': expected}}
+    report.write(json.dumps(summary) + '\n')
+    report.flush()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the integrity of the whole tree.")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--report', default='-', help="JSONL report file (default: stdout)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--strict', action='store_true', help="fail on warnings too")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.report == '-':
+        counts = validate_tree(args.base_dir, sys.stdout, args.workers)
+    else:
+        with open(args.report, 'w', encoding='utf-8') as report:
+            counts = validate_tree(args.base_dir, report, args.workers)
+    print(f"{counts['error']} errors, {counts['warning']} warnings in "
+          f"{time.perf_counter() - start:.1f}s.", file=sys.stderr)
+
+    failed = counts['error'] or (args.strict and counts['warning'])
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
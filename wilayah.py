@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+from instrumentation import count
+from tree_io import WORKERS, file_id, read_files, scan_level
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Layout of the published tree (see README "Struktur data").
+# Each level directory holds one record file per region ([id].json) and one
+# list file per parent ([parent id].json) with the children of that parent.
+# Ids are prefixed by their parent id: 11 -> 1101 -> 110101 -> 1101012001.
+PROVINSI_FILE = 'provinsi.json'
+PROPINSI_FILE = 'propinsi.json'
+
+LEVELS = {
+    'provinsi': {'dir': None, 'id_len': 2, 'parent_len': 0},
+    'kabupaten': {'dir': 'kabupaten', 'id_len': 4, 'parent_len': 2},
+    'kota': {'dir': 'kota', 'id_len': 4, 'parent_len': 2},
+    'kecamatan': {'dir': 'kecamatan', 'id_len': 6, 'parent_len': 4},
+    'kelurahan': {'dir': 'kelurahan', 'id_len': 10, 'parent_len': 6},
+}
+
+def parent_id(region_id):
+    # Parent by id prefix; kelurahan ids are 10 digits under a 6 digit kecamatan
+    if len(region_id) == 10:
+        return region_id[:6]
+    if len(region_id) > 2:
+        return region_id[:-2]
+    return None
+
+def iter_level_files(directory, id_lengths):
+    # (filename, id) for the id files in directory whose id length is in
+    # id_lengths, sorted by filename so siblings come out next to each other.
+    # Other files (e.g. the old 7 digit kelurahan lists) are skipped.
+    for region_id, entry in scan_level(directory, id_lengths):
+        yield entry.name, region_id
+
+# Filename id length -> kind of file, per level directory. The per-parent
+# list files hold a JSON array, the per-id record files a single object.
+# kelurahan also still has some old 7 digit list files.
+LIST_ID_LENGTHS = {
+    'kabupaten': (2,),
+    'kota': (2,),
+    'kecamatan': (4,),
+    'kelurahan': (6, 7),
+}
+
+def sniff_kind(path):
+    # 'list' or 'record' from the first non-whitespace byte, None if neither
+    with open(path, 'rb') as f:
+        head = f.read(64).lstrip()
+    if head.startswith(b'\xef\xbb\xbf'):
+        head = head[3:].lstrip()
+    if head[:1] == b'[':
+        return 'list'
+    if head[:1] == b'{':
+        return 'record'
+    return None
+
+def classify_file(directory, filename):
+    # 'list' or 'record' for a file in a level directory, without parsing it.
+    # The id length in the filename decides for the known layouts; anything
+    # else falls back to sniffing the first byte.
+    level = os.path.basename(os.path.normpath(directory))
+    region_id = file_id(filename)
+    if level in LEVELS and region_id is not None:
+        if len(region_id) == LEVELS[level]['id_len']:
+            return 'record'
+        if len(region_id) in LIST_ID_LENGTHS.get(level, ()):
+            return 'list'
+    return sniff_kind(os.path.join(directory, filename))
+
+# orjson (optional) parses the small files of the tree several times faster
+json_loads = orjson.loads if orjson is not None else json.loads
+
+def parse_json(raw):
+    # json_loads, counted and timed for instrumentation.py
+    start = time.perf_counter()
+    data = json_loads(raw)
+    count(parse_seconds=time.perf_counter() - start, files_read=1, bytes_read=len(raw))
+    return data
+
+def read_json(path):
+    with open(path, 'rb') as f:
+        return parse_json(f.read())
+
+def read_json_files(paths, workers=WORKERS, ordered=True, return_exceptions=False):
+    # (path, data) for every path, read from a thread pool (tree_io.read_files)
+    return read_files(paths, parse_json, workers, ordered, return_exceptions)
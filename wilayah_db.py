@@ -0,0 +1,178 @@
+import argparse
+import os
+import sqlite3
+
+from wilayah import LEVELS, PROVINSI_FILE, iter_level_files, parent_id, read_json, read_json_files
+
+# Single-file SQLite copy of the tree, one table per level keyed by id:
+#   provinsi, kabupaten (kabupaten/ and kota/ are the same data), kecamatan, kelurahan
+# Children are found through the id prefix (README: a kabupaten id starts with
+# its provinsi id, etc.), which is a range scan on the primary key.
+DB_PATH = 'wilayah.sqlite'
+
+TABLES = ['provinsi', 'kabupaten', 'kecamatan', 'kelurahan']
+
+# id length -> table
+TABLE_BY_ID_LEN = {2: 'provinsi', 4: 'kabupaten', 6: 'kecamatan', 10: 'kelurahan'}
+
+# Table -> directories holding its list files ([parent id].json) and records
+SOURCE_DIRS = {
+    'kabupaten': ['kabupaten', 'kota'],
+    'kecamatan': ['kecamatan'],
+    'kelurahan': ['kelurahan'],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id TEXT PRIMARY KEY,
+    parent_id TEXT,
+    nama TEXT NOT NULL COLLATE NOCASE,
+    latitude REAL,
+    longitude REAL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {table}_nama ON {table} (nama);
+"""
+
+def _row(entry):
+    region_id = str(entry['id'])
+    return (region_id, parent_id(region_id), entry.get('nama', ''),
+            entry.get('latitude'), entry.get('longitude'))
+
+def _entries(path, data):
+    if isinstance(data, Exception):
+        print(f"[{path}] Error reading: {data}")
+        return []
+    entries = data if isinstance(data, list) else [data]
+    return [e for e in entries if isinstance(e, dict) and 'id' in e]
+
+def _read_entries(path):
+    try:
+        data = read_json(path)
+    except Exception as e:
+        data = e
+    return _entries(path, data)
+
+def iter_rows(base_dir, table, with_records=False):
+    # Rows for one table. The per-parent list files already carry every
+    # child, so by default only those are read (7k files instead of 90k for
+    # kelurahan); with_records also reads the per-id record files.
+    if table == 'provinsi':
+        for entry in _read_entries(os.path.join(base_dir, PROVINSI_FILE)):
+            yield _row(entry)
+        return
+
+    id_len = LEVELS[table]['id_len']
+    lengths = (LEVELS[table]['parent_len'], id_len) if with_records else (LEVELS[table]['parent_len'],)
+    paths = (os.path.join(base_dir, directory, filename)
+             for directory in SOURCE_DIRS[table]
+             for filename, _ in iter_level_files(os.path.join(base_dir, directory), lengths))
+    # Files are read ahead from a thread pool, rows still come in file order
+    for path, data in read_json_files(paths, return_exceptions=True):
+        for entry in _entries(path, data):
+            if len(str(entry['id'])) == id_len:
+                yield _row(entry)
+
+def build_database(db_path=DB_PATH, base_dir='.', with_records=False):
+    # Build into a temp file and rename, so a reader never sees a partial db
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.unlink(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    counts = {}
+    try:
+        with conn:
+            for table in TABLES:
+                conn.executescript(SCHEMA.format(table=table))
+                # First row per id wins: list files before record files,
+                # kabupaten/ before its kota/ mirror
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {table} VALUES (?, ?, ?, ?, ?)",
+                    iter_rows(base_dir, table, with_records))
+                counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                print(f"{table}: {counts[table]} rows")
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    return counts
+
+# Query API
+
+def connect(db_path=DB_PATH):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _as_dict(row, table):
+    if row is None:
+        return None
+    region = dict(row)
+    region['level'] = table
+    return region
+
+def get_region(conn, region_id):
+    # Region dict for an id of any level, or None
+    region_id = str(region_id)
+    table = TABLE_BY_ID_LEN.get(len(region_id))
+    if table is None:
+        return None
+    row = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (region_id,)).fetchone()
+    return _as_dict(row, table)
+
+def get_children(conn, region_id=None):
+    # Direct children of a region (provinces for None), ordered by id
+    if region_id is None:
+        return [_as_dict(r, 'provinsi') for r in conn.execute("SELECT * FROM provinsi ORDER BY id")]
+
+    region_id = str(region_id)
+    table = TABLE_BY_ID_LEN.get({2: 4, 4: 6, 6: 10}.get(len(region_id)))
+    if table is None:
+        return []
+    # Prefix range on the primary key: '1101' <= id < '1101:' (':' sorts after '9')
+    rows = conn.execute(f"SELECT * FROM {table} WHERE id >= ? AND id < ? ORDER BY id",
+                        (region_id, region_id + ':'))
+    return [_as_dict(r, table) for r in rows]
+
+def search(conn, text, level=None, limit=20):
+    # Name search, prefix matches first then substring matches, case-insensitive
+    # level is put into the SQL as a table name, so only known levels pass
+    if level and level not in TABLES:
+        raise ValueError(f"level must be one of {', '.join(TABLES)}, not {level!r}")
+    tables = [level] if level else TABLES
+    text = text.strip()
+    if not text:
+        return []
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    queries = [
+        ("nama LIKE ? ESCAPE '\\'", (escaped + '%',)),
+        ("nama LIKE ? ESCAPE '\\' AND nama NOT LIKE ? ESCAPE '\\'",
+         ('%' + escaped + '%', escaped + '%')),
+    ]
+    results = []
+    for where, params in queries:
+        for table in tables:
+            if len(results) >= limit:
+                return results
+            rows = conn.execute(f"SELECT * FROM {table} WHERE {where} ORDER BY id LIMIT ?",
+                                params + (limit - len(results),))
+            results.extend(_as_dict(r, table) for r in rows)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite copy of the tree.")
+    parser.add_argument('--db', default=DB_PATH, help=f"output file (default: {DB_PATH})")
+    parser.add_argument('--base-dir', default='.', help="root of the data tree (default: .)")
+    parser.add_argument('--with-records', action='store_true',
+                        help="also read the per-id record files, not only the list files")
+    args = parser.parse_args()
+
+    counts = build_database(args.db, args.base_dir, args.with_records)
+    print(f"Wrote {sum(counts.values())} regions to {args.db}.")
+
+if __name__ == "__main__":
+    main()